@@ -1,21 +1,113 @@
 import os
 import json
+import hashlib
+import posixpath
+import shutil
+import tempfile
+import threading
+import io
 import boto3
+import httpx
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ParamValidationError
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import unquote_plus
 from landingai_ade import LandingAIADE
 
-s3 = boto3.client("s3")
+# orjson is optional; fall back to the stdlib encoder when it isn't bundled
+try:
+    import orjson
+    ORJSON_ENABLED = True
+except ImportError:
+    ORJSON_ENABLED = False
+
+# redis is only needed when a parse cache is configured via REDIS_URL
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
 
 VISION_AGENT_API_KEY = os.environ.get("VISION_AGENT_API_KEY")
+S3_BUCKET = os.environ.get("S3_BUCKET")
 ADE_MODEL = os.environ.get("ADE_MODEL", "dpt-2-latest")
 INPUT_FOLDER = os.environ.get("INPUT_FOLDER", "input/")
 OUTPUT_FOLDER = os.environ.get("OUTPUT_FOLDER", "output/")
 FORCE_REPROCESS = os.environ.get("FORCE_REPROCESS", "false").lower() == "true"
+CHUNK_UPLOAD_WORKERS = int(os.environ.get("CHUNK_UPLOAD_WORKERS", "32"))
+ADE_MAX_CONNECTIONS = int(os.environ.get("ADE_MAX_CONNECTIONS", "64"))
+RECORD_WORKERS = int(os.environ.get("RECORD_WORKERS", "8"))
+MAX_PARSE_CONCURRENCY = int(os.environ.get("MAX_PARSE_CONCURRENCY", "4"))
+RANGE_GET_WORKERS = int(os.environ.get("RANGE_GET_WORKERS", "16"))
+RANGE_PART_SIZE = 8 * 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+# Markdown/grounding bodies above this size are sent as concurrent multipart uploads
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_THRESHOLD,
+    multipart_chunksize=MULTIPART_THRESHOLD,
+    max_concurrency=16,
+    use_threads=True
+)
+# The Knowledge Base indexes one JSON file per chunk; set to "false" to write a single
+# <document>.jsonl per document instead (one PUT rather than one per chunk)
+LEGACY_CHUNK_FILES = os.environ.get("LEGACY_CHUNK_FILES", "true").lower() == "true"
+# Grounding JSON is machine-consumed; set to "true" for an indented, human-readable copy
+PRETTY_GROUNDING = os.environ.get("PRETTY_GROUNDING", "false").lower() == "true"
+COMPACT_JSON = (",", ":")
+# Optional ElastiCache/Redis endpoint caching parse outputs by source ETag
+REDIS_URL = os.environ.get("REDIS_URL")
+PARSE_CACHE_TTL = int(os.environ.get("PARSE_CACHE_TTL", "86400"))
+# Optional Lambda (same package, handler ade_s3_handler.chunk_writer_handler) that writes
+# grounding and chunk files asynchronously so the parse handler returns sooner
+CHUNK_WRITER_FUNCTION = os.environ.get("CHUNK_WRITER_FUNCTION")
+
+# Clients live at module scope so warm containers reuse their connection pools.
+# The S3 pool must be at least as large as the upload pool or workers queue on sockets.
+s3 = boto3.client(
+    "s3",
+    config=Config(
+        max_pool_connections=max(64, CHUNK_UPLOAD_WORKERS),
+        retries={"max_attempts": 3, "mode": "adaptive"},
+        tcp_keepalive=True,
+        connect_timeout=2,
+        read_timeout=30
+    )
+)
+
+lambda_client = boto3.client("lambda") if CHUNK_WRITER_FUNCTION else None
+
+ade_http = httpx.Client(
+    limits=httpx.Limits(
+        max_connections=ADE_MAX_CONNECTIONS,
+        max_keepalive_connections=ADE_MAX_CONNECTIONS
+    )
+)
+client = LandingAIADE(apikey=VISION_AGENT_API_KEY, http_client=ade_http)
+
+_parse_cache = None
+
+# Shared across records and warm invocations so upload threads are created once per container
+upload_pool = ThreadPoolExecutor(max_workers=CHUNK_UPLOAD_WORKERS)
 
-client = LandingAIADE(apikey=VISION_AGENT_API_KEY)
+# The SDK's file parameters accept a (filename, file object) tuple, so PDFs are parsed straight
+# from memory. Set PARSE_FROM_MEMORY=false to stage them in /tmp instead (e.g. documents
+# near the memory limit)
+PARSE_FROM_MEMORY = os.environ.get("PARSE_FROM_MEMORY", "true").lower() == "true"
+
+# Caps concurrent ADE parses across record workers
+parse_slots = threading.Semaphore(MAX_PARSE_CONCURRENCY)
+
+# Folder markers only need to be written once per bucket per warm container
+_ensured_buckets = set()
 
 def ensure_s3_folders(bucket: str):
+    if bucket in _ensured_buckets:
+        return
+    _ensured_buckets.add(bucket)
     for folder in [INPUT_FOLDER, OUTPUT_FOLDER]:
         try:
             s3.put_object(Bucket=bucket, Key=folder)
@@ -23,264 +115,725 @@ def ensure_s3_folders(bucket: str):
         except Exception as e:
             print(f"⚠️ Could not ensure folder {folder}: {e}")
 
-def ade_handler(event, context):
+def get_parse_cache():
     """
-    AWS Lambda handler for automatically parsing documents uploaded to S3/input/
-    and saving Markdown results to S3/output/ with preserved folder structure.
-    
-    File Organization:
-    - input/medical/doc.pdf → 
-        - output/medical/doc.md (markdown)
-        - output/medical_grounding/doc_grounding.json (visual data)
-        - output/medical_chunks/doc_*.json (individual chunks)
-    
-    Works correctly with any folder name including:
-    - medical, medical_records, biomedical, etc.
-    - invoices, invoice_data, etc.
-    - Any custom folder structure
+    Lazily connect to the Redis parse cache.
+
+    Returns:
+        Redis client, or None when REDIS_URL is unset or redis isn't bundled
+    """
+    global _parse_cache
+    if _parse_cache is None and REDIS_URL and REDIS_AVAILABLE:
+        _parse_cache = redis.Redis.from_url(
+            REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2
+        )
+    return _parse_cache
+
+def parse_cache_key(etag: str) -> str:
+    etag = etag.strip('"')
+    return f"ade:{etag}:{ADE_MODEL}"
+
+def parse_checkpoint_key(etag: str, source_key: str) -> str:
+    # Copies of the same PDF under different keys share an ETag but not a checkpoint,
+    # since each record's writer deletes its own once done
+    etag = etag.strip('"')
+    source_hash = hashlib.sha256(source_key.encode("utf-8")).hexdigest()[:16]
+    return f"{OUTPUT_FOLDER}.cache/{etag}_{ADE_MODEL}_{source_hash}.json"
+
+def lookup_parse_cache(etag: str) -> Optional[Dict]:
+    """
+    Find a previous parse of the same source content with the current ADE model.
+
+    Cache errors are logged and treated as a miss; the cache must never fail a record.
+
+    Returns:
+        Dict with 'bucket', 'markdown_key' and 'grounding_key', or None on a miss
+    """
+    cache = get_parse_cache()
+    if cache is None or not etag:
+        return None
+    try:
+        entry = cache.get(parse_cache_key(etag))
+    except Exception as e:
+        print(f"⚠️ Parse cache lookup failed: {e}")
+        return None
+    return json.loads(entry) if entry else None
+
+def store_parse_cache(etag: str, entry: Dict):
+    cache = get_parse_cache()
+    if cache is None or not etag:
+        return
+    try:
+        cache.setex(parse_cache_key(etag), PARSE_CACHE_TTL, dumps_json(entry))
+    except Exception as e:
+        print(f"⚠️ Parse cache store failed: {e}")
+
+def load_cached_parse(entry: Dict) -> Tuple[str, Dict]:
+    """
+    Read back the markdown and grounding payload a cached parse points to.
+
+    Returns:
+        Tuple of (markdown, payload) where payload has 'chunks', 'splits' and 'metadata'
+    """
+    bucket = entry["bucket"]
+    obj = s3.get_object(Bucket=bucket, Key=entry["markdown_key"])
+    markdown = obj["Body"].read().decode("utf-8")
+    payload = {}
+    if entry.get("grounding_key"):
+        obj = s3.get_object(Bucket=bucket, Key=entry["grounding_key"])
+        payload = json.loads(obj["Body"].read())
+    return markdown, payload
+
+def load_parse_checkpoint(bucket: str, checkpoint_key: str) -> Optional[Tuple[str, Dict]]:
+    """
+    Load the parse result saved by an earlier attempt at the same source object.
+
+    Returns:
+        Tuple of (markdown, payload), or None if no checkpoint exists
+    """
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=checkpoint_key)
+    except s3.exceptions.NoSuchKey:
+        return None
+    checkpoint = json.loads(obj["Body"].read())
+    return checkpoint.pop("markdown"), checkpoint
+
+def save_parse_checkpoint(bucket: str, checkpoint_key: str, markdown: str, payload: Dict) -> bool:
+    """
+    Persist a parse result so a failure later in the pipeline doesn't re-bill the parse.
+
+    Returns:
+        True if the checkpoint was written
+    """
+    try:
+        s3.put_object(
+            Bucket=bucket,
+            Key=checkpoint_key,
+            Body=dumps_json({"markdown": markdown, **payload}),
+            ContentType="application/json"
+        )
+        return True
+    except Exception as e:
+        print(f"⚠️ Could not save parse checkpoint: {e}")
+        return False
+
+def delete_parse_checkpoint(bucket: str, checkpoint_key: str):
+    """
+    Remove a parse checkpoint once every output it protects has been written.
+    """
+    try:
+        s3.delete_object(Bucket=bucket, Key=checkpoint_key)
+    except Exception as e:
+        print(f"⚠️ Could not delete parse checkpoint {checkpoint_key}: {e}")
+
+def dumps_json(obj, pretty: bool = False) -> bytes:
+    """
+    Serialize obj to UTF-8 JSON bytes, compact unless pretty is set.
+    """
+    if ORJSON_ENABLED:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, indent=2).encode("utf-8")
+    return json.dumps(obj, separators=COMPACT_JSON).encode("utf-8")
+
+def get_first_range(bucket: str, key: str) -> Tuple[Dict, int]:
+    """
+    Issue the first byte-range GET for an object.
+
+    The response doubles as the size probe (its Content-Range header carries
+    the object length), so objects up to RANGE_PART_SIZE need only this request.
+
+    Returns:
+        Tuple of (GetObject response, total object size in bytes)
+    """
+    try:
+        first = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{RANGE_PART_SIZE - 1}")
+    except s3.exceptions.ClientError as e:
+        # Zero-byte objects can't satisfy a range request
+        if e.response["Error"]["Code"] != "InvalidRange":
+            raise
+        first = s3.get_object(Bucket=bucket, Key=key)
+    return first, int(first.get("ContentRange", "/0").rsplit("/", 1)[1])
+
+def remaining_ranges(total: int) -> List[Tuple[int, int]]:
+    """
+    Inclusive (start, end) byte ranges for everything after the first part.
+    """
+    return [
+        (start, min(start + RANGE_PART_SIZE, total) - 1)
+        for start in range(RANGE_PART_SIZE, total, RANGE_PART_SIZE)
+    ]
+
+def fetch_byte_range(bucket: str, key: str, etag: str, dest: Path, start: int, end: int):
+    """
+    Download bytes [start, end] of an S3 object into the same offset of dest.
+
+    Each call opens its own file handle, so ranges can be written from worker threads.
+    """
+    part = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag)
+    with dest.open("r+b") as f:
+        f.seek(start)
+        shutil.copyfileobj(part["Body"], f, length=COPY_BUFFER_SIZE)
+
+def read_into(body, view: memoryview):
+    """
+    Fill view from a streaming body in COPY_BUFFER_SIZE steps, without buffering the whole part.
+    """
+    pos = 0
+    while pos < len(view):
+        chunk = body.read(min(COPY_BUFFER_SIZE, len(view) - pos))
+        if not chunk:
+            raise EOFError(f"S3 stream ended after {pos} of {len(view)} bytes")
+        view[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+
+def read_byte_range(bucket: str, key: str, etag: str, view: memoryview, start: int, end: int):
+    """
+    Read bytes [start, end] of an S3 object into the same offset of view.
+    """
+    part = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag)
+    read_into(part["Body"], view[start:end + 1])
+
+def download_s3_object(bucket: str, key: str, dest: Path) -> Dict:
+    """
+    Download an S3 object to a local file using parallel byte-range GETs.
+
+    Ranges after the first are fetched concurrently and pinned to the
+    first response's ETag so a concurrent overwrite can't mix versions.
+
+    Returns:
+        The first GetObject response (ETag, ContentType, metadata)
+    """
+    first, total = get_first_range(bucket, key)
+
+    with dest.open("wb") as f:
+        shutil.copyfileobj(first["Body"], f, length=COPY_BUFFER_SIZE)
+
+    ranges = remaining_ranges(total)
+    if ranges:
+        with ThreadPoolExecutor(max_workers=RANGE_GET_WORKERS) as pool:
+            futures = [
+                pool.submit(fetch_byte_range, bucket, key, first["ETag"], dest, start, end)
+                for start, end in ranges
+            ]
+            for future in futures:
+                future.result()
+
+    return first
+
+def read_s3_object(bucket: str, key: str) -> io.BytesIO:
+    """
+    Read an S3 object into memory using parallel byte-range GETs.
+
+    Multi-part objects are written straight into one preallocated buffer, so
+    peak memory stays at the object size instead of parts plus their join.
+
+    Returns:
+        BytesIO positioned at the start of the object
+    """
+    first, total = get_first_range(bucket, key)
+
+    ranges = remaining_ranges(total)
+    if not ranges:
+        # BytesIO shares the bytes object rather than copying it
+        return io.BytesIO(first["Body"].read())
+
+    buffer = io.BytesIO()
+    buffer.seek(total - 1)
+    buffer.write(b"\0")
+    view = buffer.getbuffer()
+    try:
+        read_into(first["Body"], view[:RANGE_PART_SIZE])
+        with ThreadPoolExecutor(max_workers=RANGE_GET_WORKERS) as pool:
+            futures = [
+                pool.submit(read_byte_range, bucket, key, first["ETag"], view, start, end)
+                for start, end in ranges
+            ]
+            for future in futures:
+                future.result()
+    finally:
+        view.release()
+    buffer.seek(0)
+    return buffer
+
+def put_s3_object(bucket: str, key: str, body: bytes, content_type: str, **extra_args):
+    """
+    Upload body to S3, switching to a multipart upload for large payloads.
+
+    Conditional writes (extra_args such as IfNoneMatch) always use a single
+    PutObject, which S3 accepts for objects up to 5 GB.
+    """
+    if len(body) < MULTIPART_THRESHOLD or extra_args:
+        try:
+            s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType=content_type, **extra_args)
+        except ParamValidationError:
+            # The Lambda runtime's bundled botocore only knows IfNoneMatch from 1.35.10 on;
+            # on older SDKs fall back to a plain PUT (the head_object check still guards it)
+            if "IfNoneMatch" not in extra_args:
+                raise
+            extra_args.pop("IfNoneMatch")
+            print(f"⚠️ Conditional PUT unsupported by this botocore; writing {key} unconditionally")
+            s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType=content_type, **extra_args)
+    else:
+        s3.upload_fileobj(
+            io.BytesIO(body), bucket, key,
+            ExtraArgs={"ContentType": content_type},
+            Config=TRANSFER_CONFIG
+        )
+
+def build_chunk_records(chunks: List[Dict], source_document: str) -> List[Dict]:
+    """
+    Convert normalized grounding chunks into Knowledge Base chunk records in one pass.
     """
-    results = []
+    records = []
+    for chunk in chunks:
+        grounding = chunk.get('grounding') or {}
+        box = grounding.get('box') or {}
+        records.append({
+            "chunk_id": chunk['id'],
+            "chunk_type": chunk.get('type', 'text'),
+            "text": chunk.get('markdown', ''),
+            "bbox": [box.get('left', 0), box.get('top', 0), box.get('right', 1), box.get('bottom', 1)],
+            "page": grounding.get('page', 0),
+            "source_document": source_document
+        })
+    return records
 
-    for record in event.get("Records", []):
-        bucket = record["s3"]["bucket"]["name"]
-        key = unquote_plus(record["s3"]["object"]["key"])
+def upload_chunk(bucket: str, chunks_folder: str, record: Dict) -> str:
+    """
+    Write a single chunk JSON file for the Knowledge Base.
+
+    Safe to call from worker threads; boto3 clients are thread-safe.
+
+    Returns:
+        S3 key of the chunk file
+    """
+    chunk_key = f"{chunks_folder}{record['source_document']}_{record['chunk_id']}.json"
+    s3.put_object(
+        Bucket=bucket,
+        Key=chunk_key,
+        Body=dumps_json(record),
+        ContentType="application/json"
+    )
+    return chunk_key
+
+def upload_chunks_jsonl(bucket: str, chunks_folder: str, source_document: str, records: List[Dict]) -> str:
+    """
+    Write all chunk records for a document as a single JSON-Lines object.
+
+    Returns:
+        S3 key of the JSON-Lines file
+    """
+    jsonl_key = f"{chunks_folder}{source_document}.jsonl"
+    s3.put_object(
+        Bucket=bucket,
+        Key=jsonl_key,
+        Body=b"\n".join(dumps_json(r) for r in records),
+        ContentType="application/x-ndjson"
+    )
+    return jsonl_key
+
+def warm_connections():
+    """
+    Open TLS connections to S3 and the ADE API during Lambda init.
+
+    Init runs once per container before the first event, so the first
+    invocation finds warm sockets in both pools. Any response (even an
+    error status) leaves a reusable connection behind; failures are ignored.
+    """
+    try:
+        ade_http.head(str(client.base_url), timeout=1)
+    except Exception as e:
+        print(f"⚠️ ADE warmup skipped: {e}")
+    if S3_BUCKET:
+        try:
+            s3.head_bucket(Bucket=S3_BUCKET)
+        except Exception as e:
+            print(f"⚠️ S3 warmup skipped: {e}")
+
+# Only warm up inside Lambda so importing this module locally stays side-effect free
+if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+    warm_connections()
+
+def write_grounding_and_chunks(
+    bucket: str,
+    payload: Dict,
+    grounding_key: str,
+    chunks_folder: str,
+    source_document: str,
+    raise_errors: bool = False
+) -> Optional[str]:
+    """
+    Write the grounding JSON and Knowledge Base chunk files for a parsed document.
+
+    Failures are logged rather than raised, since grounding output is secondary to the
+    markdown, unless raise_errors is set (the async chunk writer relies on Lambda retries).
+
+    Returns:
+        The grounding key if it was saved, otherwise None
+    """
+    try:
+        # Chunks without an id can't be addressed by the Knowledge Base or grounding lookups
+        chunks_data = [chunk for chunk in payload.get("chunks", []) if chunk.get('id')]
         
-        # Skip folder creation events
-        if key.endswith("/"):
-            print(f"⏩ Skipping folder: {key}")
-            continue
+        # Only save if we have actual chunk data
+        if chunks_data:
+            grounding_data = {
+                'chunks': chunks_data,
+                'splits': payload.get("splits", []),
+                'metadata': payload.get("metadata", {})
+            }
+            print(f"📍 Uploading visual grounding data → s3://{bucket}/{grounding_key}")
+            print(f"   Found {len(chunks_data)} chunks with grounding info")
             
-        doc_id = os.path.basename(key)
-        
-        # Skip if no filename
-        if not doc_id:
-            print(f"⏩ Skipping empty filename: {key}")
-            continue
+            # Save as compact JSON (indented only when PRETTY_GROUNDING is set)
+            grounding_future = upload_pool.submit(
+                put_s3_object,
+                bucket,
+                grounding_key,
+                dumps_json(grounding_data, pretty=PRETTY_GROUNDING),
+                "application/json"
+            )
+            
+            chunk_records = build_chunk_records(chunks_data, source_document)
+            if LEGACY_CHUNK_FILES:
+                # Create individual chunk JSON files for Knowledge Base
+                print(f"📦 Creating individual chunk files for Knowledge Base...")
+                chunk_futures = [
+                    upload_pool.submit(upload_chunk, bucket, chunks_folder, record)
+                    for record in chunk_records
+                ]
+            else:
+                print(f"📦 Creating batched chunk file for Knowledge Base...")
+                jsonl_future = upload_pool.submit(
+                    upload_chunks_jsonl, bucket, chunks_folder, source_document, chunk_records
+                )
+            
+            grounding_future.result()
+            print(f"✅ Saved grounding data: {grounding_key}")
+            
+            if LEGACY_CHUNK_FILES:
+                for future in chunk_futures:
+                    future.result()
+                print(f"✅ Created {len(chunk_records)} chunk files in {chunks_folder}")
+            else:
+                jsonl_key = jsonl_future.result()
+                print(f"✅ Wrote {len(chunk_records)} chunks to {jsonl_key}")
+            return grounding_key
+        else:
+            print(f"⚠️ No chunks found in response for grounding data")
+            
+    except Exception as e:
+        print(f"⚠️ Could not save grounding data: {e}")
+        if raise_errors:
+            raise
+    return None
 
-        print(f"🚀 Lambda triggered for new upload: {doc_id}")
-        ensure_s3_folders(bucket)
+def dispatch_chunk_writer(
+    bucket: str,
+    checkpoint_key: str,
+    grounding_key: str,
+    chunks_folder: str,
+    source_document: str,
+    etag: str,
+    markdown_key: str
+) -> bool:
+    """
+    Hand grounding and chunk writing to CHUNK_WRITER_FUNCTION via an async invoke.
 
-        if not key.startswith(INPUT_FOLDER):
-            print(f"⏩ Skipping non-input file: {key}")
-            continue
+    The payload only carries pointers; the writer reads the parse result from
+    its S3 checkpoint, which keeps the event well under the async payload limit.
+    The writer also records the parse-cache entry, once its outputs actually exist.
 
-        # Extract relative path from input folder to preserve folder structure
-        relative_path = key[len(INPUT_FOLDER):] if key.startswith(INPUT_FOLDER) else key
-        
-        # Get the directory structure and filename
-        path_parts = Path(relative_path)
-        subfolder = str(path_parts.parent) if path_parts.parent != Path('.') else ''
-        filename = path_parts.name
-        
-        # Remove the original extension (e.g., .pdf) and add .md
-        # This converts "document.pdf" to "document.md" instead of "document.pdf.md"
-        filename_without_ext = Path(filename).stem  # Gets filename without extension
+    Returns:
+        True if the invoke was accepted
+    """
+    try:
+        lambda_client.invoke(
+            FunctionName=CHUNK_WRITER_FUNCTION,
+            InvocationType="Event",
+            Payload=dumps_json({
+                "bucket": bucket,
+                "checkpoint_key": checkpoint_key,
+                "grounding_key": grounding_key,
+                "chunks_folder": chunks_folder,
+                "source_document": source_document,
+                "etag": etag,
+                "markdown_key": markdown_key
+            })
+        )
+        return True
+    except Exception as e:
+        print(f"⚠️ Could not dispatch chunk writer, writing inline: {e}")
+        return False
+
+def process_record(record: Dict) -> Optional[Dict]:
+    """
+    Parse one S3 event record and write its markdown, grounding, and chunk outputs.
+
+    Returns:
+        Result dict for the record, or None for events that aren't documents
+    """
+    bucket = record["s3"]["bucket"]["name"]
+    key = unquote_plus(record["s3"]["object"]["key"])
+    
+    # Skip folder creation events
+    if key.endswith("/"):
+        print(f"⏩ Skipping folder: {key}")
+        return None
         
-        # Build output key preserving folder structure
-        if subfolder and subfolder != '.':
-            output_key = f"{OUTPUT_FOLDER}{subfolder}/{filename_without_ext}.md"
-        else:
-            output_key = f"{OUTPUT_FOLDER}{filename_without_ext}.md"
+    doc_id = os.path.basename(key)
+    
+    # Skip if no filename
+    if not doc_id:
+        print(f"⏩ Skipping empty filename: {key}")
+        return None
 
-        # Check if output file already exists (unless force reprocess is enabled)
-        if not FORCE_REPROCESS:
-            try:
-                s3.head_object(Bucket=bucket, Key=output_key)
-                print(f"⏭️ Skipping {doc_id} - already processed (output exists: {output_key})")
-                results.append({
-                    "source": f"s3://{bucket}/{key}",
-                    "output": f"s3://{bucket}/{output_key}",
-                    "status": "skipped",
-                    "reason": "already_processed"
-                })
-                continue
-            except s3.exceptions.ClientError:
-                # File doesn't exist, proceed with processing
-                pass
+    print(f"🚀 Lambda triggered for new upload: {doc_id}")
+    ensure_s3_folders(bucket)
+
+    if not key.startswith(INPUT_FOLDER):
+        print(f"⏩ Skipping non-input file: {key}")
+        return None
+
+    # Extract relative path from input folder to preserve folder structure
+    relative_path = key[len(INPUT_FOLDER):]
+    
+    # Get the directory structure and filename (S3 keys are always POSIX-style)
+    subfolder, _, filename = relative_path.rpartition("/")
+    
+    # Remove the original extension (e.g., .pdf) and add .md
+    # This converts "document.pdf" to "document.md" instead of "document.pdf.md"
+    filename_without_ext = posixpath.splitext(filename)[0]
+    
+    # Build output key preserving folder structure
+    if subfolder:
+        output_key = f"{OUTPUT_FOLDER}{subfolder}/{filename_without_ext}.md"
+    else:
+        output_key = f"{OUTPUT_FOLDER}{filename_without_ext}.md"
+
+    # Grounding and chunk data go in parallel folders next to the top-level folder
+    # (e.g. output/medical → output/medical_grounding/, output/medical_chunks/)
+    top_folder, _, nested_folder = subfolder.partition("/")
+    base_folder = posixpath.join(OUTPUT_FOLDER, top_folder).rstrip("/")
+    nested_prefix = f"{nested_folder}/" if nested_folder else ""
+    grounding_key = f"{base_folder}_grounding/{nested_prefix}{filename_without_ext}_grounding.json"
+    chunks_folder = f"{base_folder}_chunks/"
 
+    # Check if output file already exists (unless force reprocess is enabled)
+    if not FORCE_REPROCESS:
         try:
-            print(f"📥 Fetching s3://{bucket}/{key}")
-            obj = s3.get_object(Bucket=bucket, Key=key)
-            file_bytes = obj["Body"].read()
+            s3.head_object(Bucket=bucket, Key=output_key)
+            print(f"⏭️ Skipping {doc_id} - already processed (output exists: {output_key})")
+            return {
+                "source": f"s3://{bucket}/{key}",
+                "output": f"s3://{bucket}/{output_key}",
+                "status": "skipped",
+                "reason": "already_processed"
+            }
+        except s3.exceptions.ClientError:
+            # File doesn't exist, proceed with processing
+            pass
 
-            tmp_path = Path("/tmp") / filename
-            tmp_path.write_bytes(file_bytes)
+    try:
+        # S3 event records carry the object's ETag, so the cache check costs no extra request
+        etag = record["s3"]["object"].get("eTag", "")
+        markdown = None
+        checkpoint_key = parse_checkpoint_key(etag, key) if etag else None
+        checkpoint_available = False
+        checkpoint_future = None
+        # A forced reprocess always calls ADE (e.g. after the model alias moves on);
+        # its result then replaces the cache entry below
+        cached_parse = None if FORCE_REPROCESS else lookup_parse_cache(etag)
+        if cached_parse:
+            try:
+                markdown, payload = load_cached_parse(cached_parse)
+                print(f"♻️ Reusing cached ADE output for {doc_id} → s3://{cached_parse['bucket']}/{cached_parse['markdown_key']}")
+            except s3.exceptions.ClientError as e:
+                print(f"⚠️ Cached ADE output unavailable, parsing again: {e}")
+                cached_parse = None
+        # A forced reprocess must call ADE again rather than resume an earlier parse
+        if markdown is None and checkpoint_key and not FORCE_REPROCESS:
+            checkpoint = load_parse_checkpoint(bucket, checkpoint_key)
+            if checkpoint:
+                markdown, payload = checkpoint
+                checkpoint_available = True
+                print(f"♻️ Resuming {doc_id} from parse checkpoint → s3://{bucket}/{checkpoint_key}")
+        if markdown is None and PARSE_FROM_MEMORY:
+            # Hand the bytes straight to the SDK; no /tmp write and read-back.
+            # The slot is taken before downloading (bounded to respect LandingAI rate
+            # limits), so only parsing records hold a whole PDF in memory
+            with parse_slots:
+                print(f"📥 Fetching s3://{bucket}/{key}")
+                document = (filename, read_s3_object(bucket, key))
+                print(f"🤖 Starting ADE parsing for {doc_id} (model={ADE_MODEL})")
+                response = client.parse(document=document, model=ADE_MODEL)
+                del document
+        elif markdown is None:
+            # A private temp dir per record keeps concurrent records with the same filename apart,
+            # and is removed afterwards since /tmp persists across warm invocations
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                tmp_path = Path(tmp_dir) / filename
+                print(f"📥 Fetching s3://{bucket}/{key}")
+                download_s3_object(bucket, key, tmp_path)
 
-            # Start parsing
-            print(f"🤖 Starting ADE parsing for {doc_id} (model={ADE_MODEL})")
-            response = client.parse(document=tmp_path, model=ADE_MODEL)
+                # Start parsing (bounded to respect LandingAI rate limits)
+                with parse_slots:
+                    print(f"🤖 Starting ADE parsing for {doc_id} (model={ADE_MODEL})")
+                    response = client.parse(document=tmp_path, model=ADE_MODEL)
+        if markdown is None:
             markdown = response.markdown
+            # Pydantic serializes the whole chunk/split/metadata tree in one call
+            payload = response.model_dump(
+                mode="json",
+                include={"chunks", "splits", "metadata"},
+                exclude_none=True
+            )
             print(f"✅ Finished parsing document: {doc_id}")
+            if checkpoint_key and CHUNK_WRITER_FUNCTION:
+                # The chunk writer reads the checkpoint, so it must exist before dispatch
+                checkpoint_available = save_parse_checkpoint(bucket, checkpoint_key, markdown, payload)
+            elif checkpoint_key:
+                # Only a safety net for retries here; keep it off the critical path
+                checkpoint_future = upload_pool.submit(
+                    save_parse_checkpoint, bucket, checkpoint_key, markdown, payload
+                )
 
-            print(f"⬆️ Uploading parsed Markdown → s3://{bucket}/{output_key}")
-            if subfolder and subfolder != '.':
-                print(f"   Preserved folder structure: {subfolder}/")
-            s3.put_object(
-                Bucket=bucket,
-                Key=output_key,
-                Body=markdown.encode("utf-8"),
-                ContentType="text/markdown"
+        # Upload markdown, grounding data, and chunk files concurrently.
+        # All writes are independent, so a shared pool overlaps their S3 round trips.
+        print(f"⬆️ Uploading parsed Markdown → s3://{bucket}/{output_key}")
+        if subfolder:
+            print(f"   Preserved folder structure: {subfolder}/")
+        # Conditional write lets S3 reject a duplicate that raced past the check above
+        markdown_future = upload_pool.submit(
+            put_s3_object,
+            bucket,
+            output_key,
+            markdown.encode("utf-8"),
+            "text/markdown",
+            **({} if FORCE_REPROCESS else {"IfNoneMatch": "*"})
+        )
+        
+        # With a chunk writer configured, grounding/chunk output happens after the markdown lands
+        defer_chunks = bool(CHUNK_WRITER_FUNCTION) and checkpoint_available
+        saved_grounding_key = None
+        if not defer_chunks:
+            saved_grounding_key = write_grounding_and_chunks(
+                bucket, payload, grounding_key, chunks_folder, filename_without_ext
             )
-            
-            # Save grounding data (visual references) in separate folder
-            # Use path-based approach for consistent folder structure
-            path_parts = Path(output_key).parts
-            
-            if len(path_parts) >= 2:
-                # Extract base folder structure (e.g., 'output/medical' or 'output/medical_records')
-                base_folder = str(Path(*path_parts[:2]))  # First two parts: output/foldername
-                relative_path = Path(*path_parts[2:]) if len(path_parts) > 2 else Path(path_parts[-1])
-                
-                # Create parallel folders with consistent naming
-                grounding_folder = f"{base_folder}_grounding"
-                chunks_folder = f"{base_folder}_chunks/"
-                
-                # Build the grounding key path
-                grounding_filename = str(relative_path).replace('.md', '_grounding.json')
-                grounding_key = str(Path(grounding_folder) / grounding_filename)
-            else:
-                # Fallback for files directly in output/ (shouldn't happen normally)
-                grounding_key = output_key.replace('.md', '_grounding.json')
-                chunks_folder = 'output/chunks/'
-            try:
-                # Parse and properly format grounding data
-                chunks_data = []
-                if hasattr(response, 'chunks'):
-                    for chunk in response.chunks:
-                        # Parse chunk data - handle both object and dict formats
-                        if hasattr(chunk, '__dict__'):
-                            chunk_dict = {
-                                'id': getattr(chunk, 'id', ''),
-                                'type': getattr(chunk, 'type', ''),
-                                'markdown': getattr(chunk, 'markdown', ''),
-                            }
-                            if hasattr(chunk, 'grounding'):
-                                grounding = chunk.grounding
-                                if hasattr(grounding, 'page') and hasattr(grounding, 'box'):
-                                    box = grounding.box
-                                    chunk_dict['grounding'] = {
-                                        'page': grounding.page,
-                                        'box': {
-                                            'left': getattr(box, 'left', 0),
-                                            'top': getattr(box, 'top', 0),
-                                            'right': getattr(box, 'right', 0),
-                                            'bottom': getattr(box, 'bottom', 0)
-                                        }
-                                    }
-                        else:
-                            chunk_dict = chunk
-                        chunks_data.append(chunk_dict)
-                
-                splits_data = []
-                if hasattr(response, 'splits'):
-                    for split in response.splits:
-                        if hasattr(split, '__dict__'):
-                            split_dict = {
-                                'chunks': getattr(split, 'chunks', []),
-                                'pages': getattr(split, 'pages', []),
-                                'markdown': getattr(split, 'markdown', ''),
-                                'class_': getattr(split, 'class_', '')
-                            }
-                        else:
-                            split_dict = split
-                        splits_data.append(split_dict)
-                
-                metadata_data = {}
-                if hasattr(response, 'metadata'):
-                    metadata = response.metadata
-                    if hasattr(metadata, '__dict__'):
-                        metadata_data = {
-                            'filename': getattr(metadata, 'filename', ''),
-                            'page_count': getattr(metadata, 'page_count', 0),
-                            'version': getattr(metadata, 'version', ''),
-                            'job_id': getattr(metadata, 'job_id', ''),
-                            'org_id': getattr(metadata, 'org_id', ''),
-                            'credit_usage': getattr(metadata, 'credit_usage', 0),
-                            'duration_ms': getattr(metadata, 'duration_ms', 0)
-                        }
-                    else:
-                        metadata_data = metadata
-                
-                grounding_data = {
-                    'chunks': chunks_data,
-                    'splits': splits_data,
-                    'metadata': metadata_data
-                }
-                
-                # Only save if we have actual chunk data
-                if grounding_data['chunks']:
-                    print(f"📍 Uploading visual grounding data → s3://{bucket}/{grounding_key}")
-                    print(f"   Found {len(grounding_data['chunks'])} chunks with grounding info")
-                    
-                    # Save as clean JSON
-                    s3.put_object(
-                        Bucket=bucket,
-                        Key=grounding_key,
-                        Body=json.dumps(grounding_data, indent=2).encode("utf-8"),
-                        ContentType="application/json"
-                    )
-                    print(f"✅ Saved grounding data: {grounding_key}")
-                    
-                    # Create individual chunk JSON files for Knowledge Base
-                    print(f"📦 Creating individual chunk files for Knowledge Base...")
-                    chunk_count = 0
-                    for chunk in chunks_data:
-                        chunk_id = chunk.get('id', '')
-                        if not chunk_id:
-                            continue
-                        
-                        # Extract bbox from grounding
-                        grounding = chunk.get('grounding', {})
-                        box = grounding.get('box', {})
-                        bbox = [
-                            box.get('left', 0),
-                            box.get('top', 0),
-                            box.get('right', 1),
-                            box.get('bottom', 1)
-                        ]
-                        
-                        # Create chunk JSON for Knowledge Base
-                        chunk_json = {
-                            "chunk_id": chunk_id,
-                            "chunk_type": chunk.get('type', 'text'),
-                            "text": chunk.get('markdown', ''),
-                            "bbox": bbox,
-                            "page": grounding.get('page', 0),
-                            "source_document": filename_without_ext
-                        }
-                        
-                        # Save individual chunk JSON
-                        chunk_key = f"{chunks_folder}{filename_without_ext}_{chunk_id}.json"
-                        s3.put_object(
-                            Bucket=bucket,
-                            Key=chunk_key,
-                            Body=json.dumps(chunk_json, indent=2).encode("utf-8"),
-                            ContentType="application/json"
-                        )
-                        chunk_count += 1
-                    
-                    print(f"✅ Created {chunk_count} chunk files in {chunks_folder}")
-                else:
-                    print(f"⚠️ No chunks found in response for grounding data")
-                    
-            except Exception as e:
-                print(f"⚠️ Could not save grounding data: {e}")
-
-            results.append({
+        
+        # Markdown is the primary output; surface its failure to the outer handler
+        already_processed = False
+        try:
+            markdown_future.result()
+        except s3.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] != "PreconditionFailed":
+                raise
+            already_processed = True
+        if checkpoint_future:
+            checkpoint_available = checkpoint_future.result()
+
+        if already_processed:
+            print(f"⏭️ Skipping {doc_id} - already processed (output exists: {output_key})")
+            # With a chunk writer configured, the record that won the race may still have
+            # a writer reading this checkpoint; that writer removes it instead
+            if checkpoint_available and not CHUNK_WRITER_FUNCTION:
+                delete_parse_checkpoint(bucket, checkpoint_key)
+            return {
                 "source": f"s3://{bucket}/{key}",
                 "output": f"s3://{bucket}/{output_key}",
-                "status": "success"
-            })
+                "status": "skipped",
+                "reason": "already_processed"
+            }
 
-            print(f"🎉 Completed pipeline for {doc_id} → {output_key} (clean name: {filename_without_ext}.md)")
+        if defer_chunks:
+            if dispatch_chunk_writer(
+                bucket, checkpoint_key, grounding_key, chunks_folder, filename_without_ext,
+                etag, output_key
+            ):
+                print(f"📨 Deferred grounding and chunk files for {doc_id} to {CHUNK_WRITER_FUNCTION}")
+            else:
+                defer_chunks = False
+                saved_grounding_key = write_grounding_and_chunks(
+                    bucket, payload, grounding_key, chunks_folder, filename_without_ext
+                )
 
-        except Exception as e:
-            print(f"❌ Error processing {doc_id}: {e}")
-            results.append({
-                "source": f"s3://{bucket}/{key}",
-                "error": str(e),
-                "status": "failed"
+        # All outputs are written; the chunk writer removes the checkpoint itself when deferred
+        if checkpoint_available and not defer_chunks:
+            delete_parse_checkpoint(bucket, checkpoint_key)
+
+        # When deferred, the chunk writer stores the entry after its writes succeed
+        if not cached_parse and not defer_chunks:
+            store_parse_cache(etag, {
+                "bucket": bucket,
+                "markdown_key": output_key,
+                "grounding_key": saved_grounding_key
             })
 
+        print(f"🎉 Completed pipeline for {doc_id} → {output_key} (clean name: {filename_without_ext}.md)")
+        return {
+            "source": f"s3://{bucket}/{key}",
+            "output": f"s3://{bucket}/{output_key}",
+            "status": "success"
+        }
+
+    except Exception as e:
+        print(f"❌ Error processing {doc_id}: {e}")
+        return {
+            "source": f"s3://{bucket}/{key}",
+            "error": str(e),
+            "status": "failed"
+        }
+
+def ade_handler(event, context):
+    """
+    AWS Lambda handler for automatically parsing documents uploaded to S3/input/
+    and saving Markdown results to S3/output/ with preserved folder structure.
+    
+    File Organization:
+    - input/medical/doc.pdf → 
+        - output/medical/doc.md (markdown)
+        - output/medical_grounding/doc_grounding.json (visual data)
+        - output/medical_chunks/doc_*.json (individual chunks)
+    
+    Works correctly with any folder name including:
+    - medical, medical_records, biomedical, etc.
+    - invoices, invoice_data, etc.
+    - Any custom folder structure
+    """
+    records = event.get("Records", [])
+
+    # Records are independent, so parse them concurrently
+    with ThreadPoolExecutor(max_workers=max(1, min(len(records), RECORD_WORKERS))) as pool:
+        results = [result for result in pool.map(process_record, records) if result]
+
     print("🏁 All records processed.")
-    return {"status": "ok", "results": results}
\ No newline at end of file
+    return {"status": "ok", "results": results}
+
+def chunk_writer_handler(event, context):
+    """
+    AWS Lambda handler that writes grounding and chunk files from a parse checkpoint.
+
+    Invoked asynchronously by ade_handler when CHUNK_WRITER_FUNCTION is set. S3
+    failures are raised so Lambda's async retries re-run the write; the checkpoint
+    is only removed (and the parse cached) once everything is written.
+    """
+    bucket = event["bucket"]
+    checkpoint = load_parse_checkpoint(bucket, event["checkpoint_key"])
+    if checkpoint is None:
+        # Raise so the failure shows up in Lambda's error metrics and async retries
+        print(f"❌ Parse checkpoint not found: s3://{bucket}/{event['checkpoint_key']}")
+        raise FileNotFoundError(event["checkpoint_key"])
+
+    _, payload = checkpoint
+    grounding_key = write_grounding_and_chunks(
+        bucket, payload, event["grounding_key"], event["chunks_folder"], event["source_document"],
+        raise_errors=True
+    )
+    store_parse_cache(event.get("etag", ""), {
+        "bucket": bucket,
+        "markdown_key": event["markdown_key"],
+        "grounding_key": grounding_key
+    })
+    delete_parse_checkpoint(bucket, event["checkpoint_key"])
+    return {"status": "ok" if grounding_key else "no_grounding", "grounding": grounding_key}
@@ -1,16 +1,107 @@
 """
 Lambda Deployment Helper Functions
 Utilities for deploying and managing AWS Lambda functions
+
+Use get_s3(), get_lambda(), get_logs() and get_iam() for the client arguments:
+they share one session and connection pool, so repeated helper calls reuse
+open TLS connections instead of paying a handshake per new client.
 """
 
+import base64
 import boto3
+import hashlib
+import itertools
 import json
 import time
+import shutil
 import subprocess
 import zipfile
 import os
+import re
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Optional, Any
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+
+_SESSION = boto3.session.Session()
+_CLIENT_CONFIG = Config(
+    max_pool_connections=64,
+    tcp_keepalive=True,
+    retries={"max_attempts": 5, "mode": "standard"}
+)
+# Lambda's management API throttles bursts (e.g. parallel deploys); let the SDK
+# back off adaptively on 429s instead of failing fast
+_SERVICE_CONFIGS = {
+    "lambda": _CLIENT_CONFIG.merge(Config(retries={"max_attempts": 10, "mode": "adaptive"}))
+}
+_UPLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True
+)
+_DEPLOY_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True
+)
+
+
+@lru_cache(maxsize=None)
+def get_client(service_name: str):
+    """
+    Get a shared, connection-pooled boto3 client for a service
+    
+    Args:
+        service_name: boto3 service name (e.g., 's3', 'lambda')
+    
+    Returns:
+        Cached boto3 client built from the module session
+    """
+    return _SESSION.client(service_name, config=_SERVICE_CONFIGS.get(service_name, _CLIENT_CONFIG))
+
+
+def get_s3():
+    """Shared S3 client (see get_client)"""
+    return get_client("s3")
+
+
+def get_lambda():
+    """Shared Lambda client (see get_client)"""
+    return get_client("lambda")
+
+
+def get_logs():
+    """Shared CloudWatch Logs client (see get_client)"""
+    return get_client("logs")
+
+
+def get_iam():
+    """Shared IAM client (see get_client)"""
+    return get_client("iam")
+
+
+# Serialized once at import; identical for every Lambda execution role
+_ASSUME_ROLE_POLICY_DOCUMENT = json.dumps({
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": {"Service": "lambda.amazonaws.com"},
+            "Action": "sts:AssumeRole"
+        }
+    ]
+})
+
+_LAMBDA_ROLE_POLICY_ARNS = (
+    "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole",
+    "arn:aws:iam::aws:policy/AmazonS3FullAccess",
+)
 
 
 def create_or_update_lambda_role(
@@ -24,38 +115,22 @@ def create_or_update_lambda_role(
     Returns:
         role_arn: ARN of the created/existing role
     """
-    assume_policy = {
-        "Version": "2012-10-17",
-        "Statement": [
-            {
-                "Effect": "Allow",
-                "Principal": {"Service": "lambda.amazonaws.com"},
-                "Action": "sts:AssumeRole"
-            }
-        ]
-    }
-    
     try:
         role = iam_client.create_role(
             RoleName=role_name,
-            AssumeRolePolicyDocument=json.dumps(assume_policy),
+            AssumeRolePolicyDocument=_ASSUME_ROLE_POLICY_DOCUMENT,
             Description=description
         )
         print(f"✅ Created IAM role: {role_name}")
         role_arn = role["Role"]["Arn"]
         
-        # Attach necessary policies
-        iam_client.attach_role_policy(
-            RoleName=role_name,
-            PolicyArn="arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
-        )
-        iam_client.attach_role_policy(
-            RoleName=role_name,
-            PolicyArn="arn:aws:iam::aws:policy/AmazonS3FullAccess"
-        )
+        # Attach necessary policies (independent calls, issued concurrently)
+        def attach(policy_arn: str) -> None:
+            iam_client.attach_role_policy(RoleName=role_name, PolicyArn=policy_arn)
         
-        # Wait for role to propagate
-        time.sleep(10)
+        with ThreadPoolExecutor(max_workers=len(_LAMBDA_ROLE_POLICY_ARNS)) as executor:
+            list(executor.map(attach, _LAMBDA_ROLE_POLICY_ARNS))
+        # Propagation is absorbed by deploy_lambda_function retrying create_function
         
     except iam_client.exceptions.EntityAlreadyExistsException:
         role = iam_client.get_role(RoleName=role_name)
@@ -65,11 +140,64 @@ def create_or_update_lambda_role(
     return role_arn
 
 
+# Shared wheel/HTTP cache so repeat builds don't re-download identical requirements
+PIP_CACHE_DIR = os.path.expanduser("~/.cache/sc-landingai-pip")
+
+# Zips above this size are flagged; Lambda rejects unzipped packages over 250 MB
+PACKAGE_SIZE_WARNING_MB = 50
+
+
+# Files above this size are stored uncompressed unless compression is requested
+STORE_UNCOMPRESSED_ABOVE_BYTES = 1024 * 1024
+
+
+def _zip_write(zf: zipfile.ZipFile, path: str, arcname: str, compress: bool) -> None:
+    """
+    Add a file to the archive, deflating cheaply only where it pays off
+    
+    Lambda decompresses on deploy, so large files (mostly binary wheels) are
+    stored as-is unless compress is set; small code files get a fast deflate.
+    """
+    if compress or os.path.getsize(path) <= STORE_UNCOMPRESSED_ABOVE_BYTES:
+        zf.write(path, arcname, compress_type=zipfile.ZIP_DEFLATED,
+                 compresslevel=6 if compress else 1)
+    else:
+        zf.write(path, arcname, compress_type=zipfile.ZIP_STORED)
+
+
+def _package_signature(
+    source_files: List[str],
+    requirements: List[str],
+    compress: bool = False
+) -> str:
+    """
+    Hash everything that determines the contents of a deployment package
+    
+    Args:
+        source_files: List of Python files to include
+        requirements: List of pip packages to install
+        compress: Whether the archive is fully compressed
+    
+    Returns:
+        Hex SHA-256 digest over source contents, requirements, compression
+        mode and Python version
+    """
+    h = hashlib.sha256()
+    for source_file in sorted(source_files):
+        h.update(os.path.basename(source_file).encode())
+        h.update(Path(source_file).read_bytes())
+    h.update("\n".join(sorted(requirements)).encode())
+    h.update(repr(tuple(sys.version_info[:3])).encode())
+    h.update(b"compress" if compress else b"store")
+    return h.hexdigest()
+
+
 def create_deployment_package(
     source_files: List[str],
     requirements: List[str],
     output_zip: str,
-    package_dir: str = "lambda_package"
+    package_dir: str = "lambda_package",
+    compress: bool = False
 ) -> str:
     """
     Build Lambda deployment package with dependencies
@@ -79,52 +207,137 @@ def create_deployment_package(
         requirements: List of pip packages to install
         output_zip: Name of output zip file
         package_dir: Temporary directory for building package
+        compress: Deflate every file (smaller upload for slow links); by default
+            files over 1 MB are stored uncompressed to save build time
     
     Returns:
         Path to created zip file
     """
     print(f"📦 Creating deployment package: {output_zip}")
     
+    # Skip the rebuild when sources, requirements and Python version are unchanged
+    signature = _package_signature(source_files, requirements, compress)
+    signature_file = output_zip + ".sig"
+    if os.path.exists(output_zip) and os.path.exists(signature_file):
+        try:
+            with open(signature_file) as f:
+                cached_signature = json.load(f).get("hash")
+        except (OSError, ValueError):
+            cached_signature = None
+        if cached_signature == signature:
+            zip_size = os.path.getsize(output_zip) / (1024 * 1024)
+            print(f"⏭️ Package unchanged, reusing: {output_zip} ({zip_size:.1f} MB)")
+            return output_zip
+    
+    # Drop any stale signature first so an interrupted or failed build is never reused
+    if os.path.exists(signature_file):
+        os.remove(signature_file)
+    
     # Clean and create package directory
-    subprocess.run(f"rm -rf {package_dir}", shell=True)
-    subprocess.run(f"mkdir -p {package_dir}", shell=True)
+    shutil.rmtree(package_dir, ignore_errors=True)
+    Path(package_dir).mkdir(parents=True, exist_ok=True)
     
     # Install requirements
+    install_ok = True
     if requirements:
         print(f"   Installing dependencies: {', '.join(requirements)}")
-        req_string = " ".join(requirements)
-        result = subprocess.run(
-            f"pip install --quiet {req_string} -t {package_dir}",
-            shell=True,
-            capture_output=True,
-            text=True
-        )
+        # Prefer uv (parallel resolver) when available; skip bytecode either way,
+        # since Lambda discards it on cold start
+        if shutil.which("uv"):
+            cmd = [
+                "uv", "pip", "install", "--quiet",
+                "--python", sys.executable,
+                "--cache-dir", PIP_CACHE_DIR,
+                "--target", package_dir,
+                *requirements,
+            ]
+        else:
+            cmd = [
+                sys.executable, "-m", "pip", "install", "--quiet",
+                "--no-compile",
+                "--disable-pip-version-check",
+                "--cache-dir", PIP_CACHE_DIR,
+                "-t", package_dir,
+                *requirements,
+            ]
+        result = subprocess.run(cmd, check=False, capture_output=True, text=True)
         if result.returncode != 0:
+            install_ok = False
             print(f"⚠️ Warning: Some dependencies may have failed to install")
             print(result.stderr)
     
-    # Copy source files
-    for source_file in source_files:
-        print(f"   Adding source: {source_file}")
-        subprocess.run(f"cp {source_file} {package_dir}/", shell=True)
-    
-    # Create zip
+    # Create zip, streaming dependencies and source files straight into the archive
     print(f"   Creating zip archive...")
-    subprocess.run(
-        f"cd {package_dir} && zip -r ../{output_zip} . > /dev/null 2>&1",
-        shell=True
-    )
+    source_names = {os.path.basename(source_file) for source_file in source_files}
+    with zipfile.ZipFile(output_zip, "w") as zf:
+        for root, dirs, files in os.walk(package_dir):
+            # Bytecode caches are rebuilt by the runtime and only bloat the artifact
+            dirs[:] = [d for d in dirs if d != "__pycache__"]
+            in_dist_info = root.endswith(".dist-info")
+            for name in files:
+                if in_dist_info and name == "RECORD":
+                    continue
+                full_path = os.path.join(root, name)
+                arcname = os.path.relpath(full_path, package_dir)
+                # Source files take precedence over same-named dependency files
+                if arcname in source_names:
+                    continue
+                _zip_write(zf, full_path, arcname, compress)
+        
+        for source_file in source_files:
+            print(f"   Adding source: {source_file}")
+            _zip_write(zf, source_file, os.path.basename(source_file), compress)
     
     # Cleanup
-    subprocess.run(f"rm -rf {package_dir}", shell=True)
+    shutil.rmtree(package_dir, ignore_errors=True)
     
     # Get zip size
     zip_size = os.path.getsize(output_zip) / (1024 * 1024)
     print(f"✅ Package created: {output_zip} ({zip_size:.1f} MB)")
+    if zip_size > PACKAGE_SIZE_WARNING_MB:
+        print(f"⚠️ Warning: Package exceeds {PACKAGE_SIZE_WARNING_MB} MB; consider trimming dependencies")
+    
+    # Record the signature only after a successful build, so a package missing
+    # dependencies is rebuilt on the next call
+    if install_ok:
+        with open(signature_file, "w") as f:
+            json.dump({"hash": signature}, f)
     
     return output_zip
 
 
+# Lambda waiters poll every second instead of blind multi-second sleeps
+_LAMBDA_WAITER_CONFIG = {"Delay": 1, "MaxAttempts": 60}
+
+# Zips above this size are staged through S3 instead of sent inline (hard cap 50 MB)
+INLINE_ZIP_MAX_BYTES = 6 * 1024 * 1024
+
+# A freshly created IAM role can take a few seconds before Lambda may assume it
+ROLE_PROPAGATION_ATTEMPTS = 8
+
+
+def _create_function_with_role_retry(lambda_client, **kwargs) -> Dict:
+    """
+    Call create_function, retrying with backoff while a new IAM role propagates
+    
+    Args:
+        lambda_client: Boto3 Lambda client
+        **kwargs: Arguments forwarded to create_function
+    
+    Returns:
+        create_function response
+    """
+    for attempt in range(ROLE_PROPAGATION_ATTEMPTS):
+        try:
+            return lambda_client.create_function(**kwargs)
+        except lambda_client.exceptions.InvalidParameterValueException as e:
+            if "cannot be assumed" not in str(e) or attempt == ROLE_PROPAGATION_ATTEMPTS - 1:
+                raise
+            delay = min(2 ** attempt, 8)
+            print(f"   Role not yet assumable, retrying in {delay}s...")
+            time.sleep(delay)
+
+
 def deploy_lambda_function(
     lambda_client,
     function_name: str,
@@ -135,34 +348,55 @@ def deploy_lambda_function(
     runtime: str = "python3.10",
     timeout: int = 900,
     memory_size: int = 3008,
-    architectures: List[str] = ["x86_64"]
+    architectures: List[str] = ["x86_64"],
+    staging_bucket: Optional[str] = None,
+    s3_client=None
 ) -> Dict:
     """
     Deploy or update Lambda function
     
+    Args:
+        staging_bucket: Optional bucket for staging zips larger than 6 MB;
+            the code is then deployed from S3 instead of inline
+        s3_client: Boto3 S3 client used for staging (defaults to get_s3())
+    
     Returns:
         Function configuration dict
     """
     print(f"🚀 Deploying Lambda function: {function_name}")
     
-    # Read zip file
-    with open(zip_file, "rb") as f:
-        zipped_code = f.read()
+    if staging_bucket and os.path.getsize(zip_file) > INLINE_ZIP_MAX_BYTES:
+        # Multipart upload straight from disk; the zip never sits in memory
+        staging_key = f"lambda-deployments/{function_name}/{os.path.basename(zip_file)}"
+        print(f"   Staging package at s3://{staging_bucket}/{staging_key}")
+        (s3_client or get_s3()).upload_file(
+            zip_file, staging_bucket, staging_key, Config=_DEPLOY_TRANSFER_CONFIG
+        )
+        code = {"S3Bucket": staging_bucket, "S3Key": staging_key}
+    else:
+        # Read zip file
+        with open(zip_file, "rb") as f:
+            code = {"ZipFile": f.read()}
     
     try:
         # Try to create new function
-        response = lambda_client.create_function(
+        response = _create_function_with_role_retry(
+            lambda_client,
             FunctionName=function_name,
             Runtime=runtime,
             Role=role_arn,
             Handler=handler,
-            Code={"ZipFile": zipped_code},
+            Code=code,
             Timeout=timeout,
             MemorySize=memory_size,
             Architectures=architectures,
             Environment={"Variables": env_vars},
             Publish=True
         )
+        lambda_client.get_waiter("function_active_v2").wait(
+            FunctionName=function_name,
+            WaiterConfig=_LAMBDA_WAITER_CONFIG
+        )
         print(f"✅ Lambda function created: {function_name}")
         
     except lambda_client.exceptions.ResourceConflictException:
@@ -172,11 +406,14 @@ def deploy_lambda_function(
         # Update code
         lambda_client.update_function_code(
             FunctionName=function_name,
-            ZipFile=zipped_code,
+            **code,
             Publish=True
         )
         print("   Code updated, waiting for deployment...")
-        time.sleep(10)
+        lambda_client.get_waiter("function_updated_v2").wait(
+            FunctionName=function_name,
+            WaiterConfig=_LAMBDA_WAITER_CONFIG
+        )
         
         # Update configuration
         response = lambda_client.update_function_configuration(
@@ -192,6 +429,94 @@ def deploy_lambda_function(
     return response
 
 
+# Function ARNs never change for a given name, so resolve each only once
+_FUNCTION_ARNS: Dict[str, str] = {}
+
+
+def _function_arn(lambda_client, function_name: str) -> str:
+    """
+    Get a Lambda function's ARN, memoized per function name
+    """
+    if function_name not in _FUNCTION_ARNS:
+        function_config = lambda_client.get_function(FunctionName=function_name)
+        _FUNCTION_ARNS[function_name] = function_config["Configuration"]["FunctionArn"]
+    return _FUNCTION_ARNS[function_name]
+
+
+def _filter_key(config: Dict) -> tuple:
+    """
+    Normalize a notification's filter rules to a (prefix, suffix) tuple
+    """
+    rules = config.get("Filter", {}).get("Key", {}).get("FilterRules", [])
+    values = {rule["Name"].lower(): rule["Value"] for rule in rules}
+    return values.get("prefix", ""), values.get("suffix", "")
+
+
+def _filters_overlap(a: tuple, b: tuple) -> bool:
+    """
+    Check whether two (prefix, suffix) filters can match the same key, which S3 rejects
+    """
+    (prefix_a, suffix_a), (prefix_b, suffix_b) = a, b
+    prefixes = prefix_a.startswith(prefix_b) or prefix_b.startswith(prefix_a)
+    suffixes = suffix_a.endswith(suffix_b) or suffix_b.endswith(suffix_a)
+    return prefixes and suffixes
+
+
+# Application-level retries on top of the SDK's own throttling backoff
+DEPLOY_THROTTLE_ATTEMPTS = 5
+
+
+def _deploy_with_backoff(lambda_client, config: Dict) -> Dict:
+    """
+    Deploy one function, backing off when the Lambda API throttles
+    """
+    for attempt in range(DEPLOY_THROTTLE_ATTEMPTS):
+        try:
+            return deploy_lambda_function(lambda_client, **config)
+        except ClientError as e:
+            if (e.response["Error"]["Code"] != "TooManyRequestsException"
+                    or attempt == DEPLOY_THROTTLE_ATTEMPTS - 1):
+                raise
+            time.sleep(2 ** attempt)
+
+
+def deploy_many(
+    lambda_client,
+    configs: List[Dict[str, Any]],
+    concurrency: int = 10
+) -> Dict[str, Dict]:
+    """
+    Deploy several Lambda functions in parallel with bounded concurrency
+    
+    Args:
+        lambda_client: Boto3 Lambda client (get_lambda() adds adaptive retries)
+        configs: Keyword arguments for deploy_lambda_function, one dict per function
+        concurrency: Maximum deployments in flight (default 10, below API limits)
+    
+    Returns:
+        Dict mapping function name to its configuration, for successful deploys
+    """
+    print(f"🚀 Deploying {len(configs)} Lambda functions ({concurrency} at a time)")
+    
+    results = {}
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(configs)))) as executor:
+        futures = {
+            executor.submit(_deploy_with_backoff, lambda_client, config): config["function_name"]
+            for config in configs
+        }
+        for future in as_completed(futures):
+            function_name = futures[future]
+            try:
+                results[function_name] = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ Failed to deploy {function_name}: {e}")
+    
+    print(f"✅ Deployed {len(results)} functions" + (f", {failed} failed" if failed else ""))
+    return results
+
+
 def setup_s3_trigger(
     s3_client,
     lambda_client,
@@ -212,8 +537,7 @@ def setup_s3_trigger(
     print(f"⚙️ Setting up S3 trigger: s3://{bucket}/{prefix} → {function_name}")
     
     # Get Lambda function ARN
-    function_config = lambda_client.get_function(FunctionName=function_name)
-    function_arn = function_config["Configuration"]["FunctionArn"]
+    function_arn = _function_arn(lambda_client, function_name)
     
     # Give S3 permission to invoke the Lambda
     try:
@@ -233,19 +557,38 @@ def setup_s3_trigger(
     if suffix:
         filter_rules.append({"Name": "suffix", "Value": suffix})
     
-    # Attach the notification configuration to S3
-    # Note: This replaces ALL existing Lambda notifications - use carefully
+    # Merge into the bucket's existing notifications instead of replacing them;
+    # earlier entries for this function, and any whose filter overlaps the new
+    # one, are superseded by it
+    notification = s3_client.get_bucket_notification_configuration(Bucket=bucket)
+    notification.pop("ResponseMetadata", None)
+    new_filter = (prefix, suffix or "")
+    lambda_configs = notification.get("LambdaFunctionConfigurations", [])
+    
+    if any(
+        config["LambdaFunctionArn"] == function_arn and _filter_key(config) == new_filter
+        for config in lambda_configs
+    ):
+        print(f"✅ S3 trigger already set for s3://{bucket}/{prefix} → {function_name}")
+        return
+    
+    notification["LambdaFunctionConfigurations"] = [
+        config for config in lambda_configs
+        if config["LambdaFunctionArn"] != function_arn
+        and not (
+            _filters_overlap(_filter_key(config), new_filter)
+            and any(event.startswith(("s3:ObjectCreated", "s3:*")) for event in config.get("Events", []))
+        )
+    ] + [
+        {
+            "LambdaFunctionArn": function_arn,
+            "Events": ["s3:ObjectCreated:*"],
+            "Filter": {"Key": {"FilterRules": filter_rules}}
+        }
+    ]
     s3_client.put_bucket_notification_configuration(
         Bucket=bucket,
-        NotificationConfiguration={
-            "LambdaFunctionConfigurations": [
-                {
-                    "LambdaFunctionArn": function_arn,
-                    "Events": ["s3:ObjectCreated:*"],
-                    "Filter": {"Key": {"FilterRules": filter_rules}}
-                }
-            ]
-        }
+        NotificationConfiguration=notification
     )
     
     print(f"✅ S3 trigger set for s3://{bucket}/{prefix} → {function_name}")
@@ -299,7 +642,6 @@ def invoke_lambda_sync(
     
     # Show logs if requested
     if show_logs and "LogResult" in response:
-        import base64
         log_data = base64.b64decode(response["LogResult"]).decode("utf-8")
         print("\n📋 Lambda Logs:")
         print("-" * 60)
@@ -311,6 +653,22 @@ def invoke_lambda_sync(
     return result
 
 
+def _list_files(s3_client, bucket: str, prefix: str) -> List[str]:
+    """
+    List every file (not folder marker) under a prefix, following pagination
+    
+    Returns:
+        File keys in listing order
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    return [
+        obj["Key"]
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+        for obj in page.get("Contents", [])
+        if not obj["Key"].endswith("/")
+    ]
+
+
 def monitor_s3_folder(
     s3_client,
     bucket: str,
@@ -330,13 +688,7 @@ def monitor_s3_folder(
     """
     print(f"📁 Monitoring s3://{bucket}/{prefix}")
     
-    response = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix)
-    
-    files = []
-    if "Contents" in response:
-        for obj in response["Contents"]:
-            if not obj["Key"].endswith("/"):
-                files.append(obj["Key"])
+    files = _list_files(s3_client, bucket, prefix)
     
     print(f"   Found {len(files)} files")
     
@@ -346,13 +698,71 @@ def monitor_s3_folder(
     return files
 
 
+def _list_keys(s3_client, bucket: str, prefix: str) -> frozenset:
+    """
+    List every key under a prefix using paginated list_objects_v2 calls
+    
+    Returns:
+        Set of existing keys (one request per 1000 keys)
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    return frozenset(
+        obj["Key"]
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+        for obj in page.get("Contents", [])
+    )
+
+
+def _key_exists(s3_client, bucket: str, key: str) -> bool:
+    """
+    Check a single key with head_object (safe to call from worker threads)
+    """
+    try:
+        s3_client.head_object(Bucket=bucket, Key=key)
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+def _head_keys(s3_client, bucket: str, keys: List[str], max_workers: int) -> frozenset:
+    """
+    Check many keys with concurrent head_object calls
+    
+    Returns:
+        Subset of keys that exist in the bucket
+    """
+    if not keys:
+        return frozenset()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        found = executor.map(lambda key: _key_exists(s3_client, bucket, key), keys)
+        return frozenset(key for key, exists in zip(keys, found) if exists)
+
+
+def _upload_one(
+    s3_client,
+    bucket: str,
+    file_path: Path,
+    s3_key: str,
+    relative_path: Path
+):
+    """
+    Upload a single file (safe to call from worker threads)
+    """
+    print(f"   ⬆️ Uploading: {relative_path}")
+    s3_client.upload_file(str(file_path), bucket, s3_key, Config=_UPLOAD_TRANSFER_CONFIG)
+
+
 def upload_folder_to_s3(
     s3_client,
     local_folder: str,
     s3_prefix: str,
     bucket: str,
     file_extensions: Optional[List[str]] = None,
-    skip_existing: bool = True
+    skip_existing: bool = True,
+    max_workers: int = 32,
+    existence_check: str = "list"
 ) -> int:
     """
     Upload entire folder to S3
@@ -363,6 +773,10 @@ def upload_folder_to_s3(
         bucket: S3 bucket name
         file_extensions: Optional list of extensions to filter
         skip_existing: Skip files that already exist in S3 (default True)
+        max_workers: Number of files uploaded concurrently (default 32)
+        existence_check: "list" to list the prefix once (default), or "head" to
+            check each file concurrently when the prefix holds far more keys
+            than are being uploaded
     
     Returns:
         Number of files uploaded
@@ -379,9 +793,9 @@ def upload_folder_to_s3(
         print(f"❌ Folder not found: {local_folder}")
         return 0
     
-    files = list(local_path.glob("**/*"))
-    
-    for file_path in files:
+    # Collect upload candidates first so the network work can run in parallel
+    candidates = []
+    for file_path in local_path.glob("**/*"):
         if file_path.is_file():
             # Check extension filter
             if file_extensions and file_path.suffix.lower() not in file_extensions:
@@ -390,21 +804,33 @@ def upload_folder_to_s3(
             # Calculate S3 key
             relative_path = file_path.relative_to(local_path)
             s3_key = f"{s3_prefix}{relative_path}"
-            
-            # Check if file already exists in S3
-            if skip_existing:
-                try:
-                    s3_client.head_object(Bucket=bucket, Key=s3_key)
-                    print(f"   ⏭️ Skipping (already exists): {relative_path}")
-                    skipped += 1
-                    continue
-                except s3_client.exceptions.ClientError:
-                    # File doesn't exist, proceed with upload
-                    pass
-            
-            # Upload file
-            print(f"   ⬆️ Uploading: {relative_path}")
-            s3_client.upload_file(str(file_path), bucket, s3_key)
+            candidates.append((file_path, s3_key, relative_path))
+    
+    # One paginated listing replaces a head_object round trip per file, unless
+    # the prefix is so large that checking just our keys is cheaper
+    if not skip_existing:
+        existing = frozenset()
+    elif existence_check == "head":
+        existing = _head_keys(s3_client, bucket, [c[1] for c in candidates], max_workers)
+    else:
+        existing = _list_keys(s3_client, bucket, s3_prefix)
+    
+    # Check if file already exists in S3
+    pending = []
+    for file_path, s3_key, relative_path in candidates:
+        if s3_key in existing:
+            print(f"   ⏭️ Skipping (already exists): {relative_path}")
+            skipped += 1
+            continue
+        pending.append((file_path, s3_key, relative_path))
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_upload_one, s3_client, bucket, file_path, s3_key, relative_path)
+            for file_path, s3_key, relative_path in pending
+        ]
+        for future in as_completed(futures):
+            future.result()
             uploaded += 1
     
     # Summary
@@ -416,13 +842,47 @@ def upload_folder_to_s3(
     return uploaded
 
 
+# One precompiled pattern per pipeline event the monitor classifies; the file
+# name is captured up to the delimiter ade_s3_handler prints after it
+_PATTERNS = [
+    ("done", re.compile(r"Completed pipeline for (?P<f>.+?) →")),
+    ("start", re.compile(r"Starting ADE parsing for (?P<f>.+?) \(")),
+    ("skip", re.compile(r"Skipping (?P<f>.+?) - already processed")),
+    ("err", re.compile(r"Error processing (?P<f>[^:]+):")),
+]
+
+# Server-side filter so CloudWatch only returns the lines the monitor classifies
+LOG_FILTER_PATTERN = (
+    '?"Completed pipeline for" ?"Skipping" ?"Error processing" ?"Starting ADE parsing for"'
+)
+
+
+def _log_group_arn(logs_client, log_group: str) -> Optional[str]:
+    """
+    Resolve a log group name to the ARN Live Tail expects
+    
+    Args:
+        logs_client: Boto3 CloudWatch Logs client
+        log_group: Log group name
+    
+    Returns:
+        Log group ARN (without the trailing ':*'), or None if not found
+    """
+    resp = logs_client.describe_log_groups(logGroupNamePrefix=log_group)
+    for group in resp.get("logGroups", []):
+        if group["logGroupName"] == log_group:
+            return group.get("logGroupArn") or group["arn"].removesuffix(":*")
+    return None
+
+
 def monitor_lambda_processing(
     logs_client,
     s3_client,
     bucket_name: str,
     function_name: str = "ade-s3-handler",
     lookback_minutes: int = 10,
-    output_prefix: str = "output/"
+    output_prefix: str = "output/",
+    show_all_files: bool = False
 ) -> Dict:
     """
     Monitor Lambda processing and display results.
@@ -434,72 +894,100 @@ def monitor_lambda_processing(
         function_name: Lambda function name to monitor
         lookback_minutes: How many minutes back to look in logs
         output_prefix: S3 prefix for output files
+        show_all_files: Whether to list every output file after the folder summary
     
     Returns:
         Dict with processing statistics
     """
-    import time
-    
     log_group = f"/aws/lambda/{function_name}"
     
     print(f"⏳ Monitoring Lambda processing...")
     print(" To stop monitoring, press esc followed by double clicking i\n")
     
-    # Track processed files
-    processed_files = set()
-    processing_files = set()
-    skipped_files = set()
-    error_files = set()
+    # Track the latest pipeline status per file: "start", "done", "skip" or "err"
+    status: Dict[str, str] = {}
     start_time = int((time.time() - (lookback_minutes * 60)) * 1000)
     
-    try:
+    def handle(message: str) -> None:
+        for kind, pattern in _PATTERNS:
+            match = pattern.search(message)
+            if match:
+                break
+        else:
+            return
+        file_name = match.group("f")
+        previous = status.get(file_name)
+        # A file that finished is done for good; later retries, skips or errors
+        # on the same name must not pull it back out of the processed count
+        if previous != "done":
+            status[file_name] = kind
+        
+        # Track successful completions
+        if kind == "done":
+            if previous != "done":
+                print(f"✅ Processed: {file_name}")
+        
+        # Track skipped files
+        elif kind == "skip":
+            if previous != "skip":
+                print(f"⏭️ Skipped (already exists): {file_name}")
+        
+        # Show errors (files being processed are tracked but not printed)
+        elif kind == "err":
+            print(f"   {message}")
+    
+    def poll(since: int) -> int:
+        kwargs = {
+            "logGroupName": log_group,
+            "startTime": since,
+            "filterPattern": LOG_FILTER_PATTERN,
+        }
+        latest = since
         while True:
-            resp = logs_client.filter_log_events(logGroupName=log_group, startTime=start_time)
-            events = resp.get("events", [])
-            
-            for event in events:
-                message = event["message"].strip()
-                
-                # Track successful completions
-                if "🎉 Completed pipeline for" in message:
-                    file_name = message.split("Completed pipeline for ")[1].split(" →")[0]
-                    if file_name not in processed_files:
-                        processed_files.add(file_name)
-                        print(f"✅ Processed: {file_name}")
-                
-                # Track files being processed (but don't print)
-                elif "🤖 Starting ADE parsing for" in message:
-                    file_name = message.split("parsing for ")[1].split(" (")[0]
-                    processing_files.add(file_name)
-                
-                # Track skipped files
-                elif "⏭️ Skipping" in message and "already processed" in message:
-                    file_name = message.split("Skipping ")[1].split(" -")[0]
-                    if file_name not in skipped_files:
-                        skipped_files.add(file_name)
-                        print(f"⏭️ Skipped (already exists): {file_name}")
-                
-                # Show errors
-                elif "❌ Error processing" in message:
-                    print(f"   {message}")
-                    try:
-                        file_name = message.split("Error processing ")[1].split(":")[0]
-                        error_files.add(file_name)
-                    except:
-                        pass
-                
-                start_time = max(start_time, event["timestamp"] + 1)
-            
-            time.sleep(5)
+            resp = logs_client.filter_log_events(**kwargs)
+            for event in resp.get("events", []):
+                handle(event["message"].strip())
+                latest = max(latest, event["timestamp"] + 1)
+            if "nextToken" not in resp:
+                return latest
+            kwargs["nextToken"] = resp["nextToken"]
+    
+    try:
+        # Backfill the lookback window, then stream new events as they arrive
+        start_time = poll(start_time)
+        log_group_arn = _log_group_arn(logs_client, log_group)
+        try:
+            if log_group_arn is None:
+                raise LookupError(log_group)
+            live_tail = logs_client.start_live_tail(
+                logGroupIdentifiers=[log_group_arn],
+                logEventFilterPattern=LOG_FILTER_PATTERN
+            )
+        except (AttributeError, LookupError, logs_client.exceptions.AccessDeniedException):
+            # Older botocore, unknown group or missing logs:StartLiveTail permission
+            print("ℹ️ Live Tail unavailable, falling back to polling")
+            while True:
+                time.sleep(5)
+                start_time = poll(start_time)
+        
+        stream = live_tail["responseStream"]
+        try:
+            for update in stream:
+                for event in update.get("sessionUpdate", {}).get("sessionResults", []):
+                    handle(event["message"].strip())
+        finally:
+            stream.close()
             
     except KeyboardInterrupt:
         print(f"\n⛔ Monitoring stopped by user")
     
     # Show summary from logs
+    counts = Counter(status.values())
+    processed_files = [f for f, kind in status.items() if kind == "done"]
     print(f"\n📊 Lambda Processing Summary:")
-    print(f"   Processed: {len(processed_files)} files")
-    print(f"   Skipped: {len(skipped_files)} files")
-    print(f"   Errors: {len(error_files)} files")
+    print(f"   Processed: {counts['done']} files")
+    print(f"   Skipped: {counts['skip']} files")
+    print(f"   Errors: {counts['err']} files")
     
     if processed_files:
         print("\n   Files processed in this session:")
@@ -508,43 +996,31 @@ def monitor_lambda_processing(
     
     # Check what's actually in the output folder
     print(f"\n📁 Checking S3 {output_prefix} folder...")
-    response = s3_client.list_objects_v2(
-        Bucket=bucket_name,
-        Prefix=output_prefix,
-        MaxKeys=1000  # Get all files
-    )
-    
-    output_files = []
-    if "Contents" in response:
-        output_files = [obj["Key"] for obj in response["Contents"] if not obj["Key"].endswith("/")]
+    output_files = _list_files(s3_client, bucket_name, output_prefix)
+    if output_files:
         print(f"   Total files in {output_prefix}: {len(output_files)}")
         
-        # Organize by folder
-        folders = {}
-        for key in output_files:
-            parts = key.split("/")
-            if len(parts) > 2:  # Has subfolder
-                folder = parts[1]
-                if folder not in folders:
-                    folders[folder] = []
-                folders[folder].append(key)
-            elif len(parts) == 2:  # Direct in output/
-                if "root" not in folders:
-                    folders["root"] = []
-                folders["root"].append(key)
+        # Organize by folder: subfolder name, or "root" for files directly in output/
+        def bucket(key: str) -> str:
+            parts = key.split("/", 2)
+            return parts[1] if len(parts) > 2 and parts[1] else "root"
+        
+        folders = {
+            folder: sum(1 for _ in group)
+            for folder, group in itertools.groupby(sorted(output_files, key=bucket), key=bucket)
+        }
         
         # Display organized summary
         if folders:
             print(f"\n   Files by folder:")
-            for folder, files in sorted(folders.items()):
+            for folder, count in sorted(folders.items()):
                 if folder == "root":
-                    print(f"   {output_prefix} (root): {len(files)} files")
+                    print(f"   {output_prefix} (root): {count} files")
                 else:
-                    print(f"   {output_prefix}{folder}/: {len(files)} files")
+                    print(f"   {output_prefix}{folder}/: {count} files")
             
             # Option to show all files
-            show_all = input("\n   Show all output files? (y/n): ").lower() == 'y'
-            if show_all:
+            if show_all_files:
                 print("\n   All output files:")
                 for key in sorted(output_files):
                     print(f"   - {key}")
@@ -552,10 +1028,10 @@ def monitor_lambda_processing(
         print(f"   No files found in {output_prefix} yet")
     
     return {
-        "processed": len(processed_files),
-        "skipped": len(skipped_files),
-        "errors": len(error_files),
+        "processed": counts["done"],
+        "skipped": counts["skip"],
+        "errors": counts["err"],
         "total_output_files": len(output_files),
-        "processed_files": list(processed_files),
+        "processed_files": processed_files,
         "output_files": output_files
     }
\ No newline at end of file
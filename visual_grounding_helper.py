@@ -4,9 +4,17 @@ Utilities for creating annotated images with bounding boxes from document chunks
 """
 
 import json
+import logging
+import time
 import boto3
+from botocore.exceptions import ClientError
 from typing import Dict, List, Optional, Tuple
 import io
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 
 # Check if dynamic cropping dependencies are available
@@ -17,22 +25,246 @@ try:
 except ImportError:
     DYNAMIC_CROPPING_ENABLED = False
 
+# NumPy is optional; bbox scaling falls back to plain Python without it
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
 # Constants
 CHUNK_IMAGES_PATH = "chunk_images"
 DEFAULT_DPI = 150
+MIN_DPI = 72
+TARGET_CHUNK_WIDTH_PX = 1000  # Chunk crops are displayed well below this width
 DEFAULT_PADDING = 20
 BOX_COLOR = "red"
 BOX_WIDTH = 3
+FILL_OPACITY = 30 / 255  # Semi-transparent box fill
+PNG_COMPRESS_LEVEL = 1  # zlib level 1: several times faster than the default 6, ~10% larger
+JPEG_QUALITY = 85
+PRESIGN_TTL = 3600  # URL valid for 1 hour
+PRESIGN_REFRESH_MARGIN = 300  # Re-sign when less than 5 minutes remain
+
+# PyMuPDF is not thread-safe; MuPDF calls are serialized while S3 I/O, PNG
+# encoding and uploads from other threads still overlap
+_RENDER_LOCK = threading.RLock()
+
+# Anchor tags with IDs, e.g. <a id="chunk_123"></a>
+_CHUNK_ID_RE = re.compile(r'<a id=["\'](.*?)["\']></a>')
+
+# (bucket, key) -> (presigned URL, expiry timestamp)
+_PRESIGN_CACHE: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+
+# (bucket, key) -> expiry timestamp of the last existence check result
+EXISTS_TTL = 3600
+MISSING_TTL = 30  # Short, so images created elsewhere are picked up quickly
+_EXISTS: Dict[Tuple[str, str], float] = {}
+_MISSING: Dict[Tuple[str, str], float] = {}
+
+
+def _object_exists(s3_client, bucket: str, key: str) -> bool:
+    """
+    Check whether an object exists, skipping the HEAD while a recent answer is cached
+    """
+    now = time.time()
+    if _EXISTS.get((bucket, key), 0) > now:
+        return True
+    if _MISSING.get((bucket, key), 0) > now:
+        return False
+    
+    try:
+        s3_client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        # Only a miss means "create it"; throttling and other errors surface. Without
+        # s3:ListBucket, S3 answers HEAD on a missing key with 403, so that counts as a miss
+        # and the subsequent GET/PUT decides whether access is really denied
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound', '403', 'Forbidden', 'AccessDenied'):
+            raise
+        _MISSING[(bucket, key)] = now + MISSING_TTL
+        return False
+    _mark_exists(bucket, key)
+    return True
+
+
+def _mark_exists(bucket: str, key: str) -> None:
+    """
+    Record an object as present (after a successful HEAD or PUT)
+    """
+    _EXISTS[(bucket, key)] = time.time() + EXISTS_TTL
+    _MISSING.pop((bucket, key), None)
+
+
+def _presign(s3_client, bucket: str, key: str, ttl: int = PRESIGN_TTL) -> str:
+    """
+    Get a presigned GET URL, reusing a cached one while it has time left
+    """
+    cached = _PRESIGN_CACHE.get((bucket, key))
+    now = time.time()
+    if cached and cached[1] - now > PRESIGN_REFRESH_MARGIN:
+        return cached[0]
+    
+    url = s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': bucket, 'Key': key},
+        ExpiresIn=ttl
+    )
+    _PRESIGN_CACHE[(bucket, key)] = (url, now + ttl)
+    return url
+
+
+# (bucket, key, ETag) -> PDF bytes, least recently used first
+PDF_CACHE_SIZE = 16
+_PDF_CACHE: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+_PDF_CACHE_LOCK = threading.Lock()
+
+
+def _get_pdf_bytes(s3_client, bucket: str, key: str) -> bytes:
+    """
+    Download a source PDF, reusing the bytes while its ETag is unchanged.
+    
+    The HEAD per call means a document re-uploaded under the same key is
+    fetched again instead of serving crops from the stale copy.
+    """
+    etag = s3_client.head_object(Bucket=bucket, Key=key)['ETag']
+    cache_key = (bucket, key, etag)
+    with _PDF_CACHE_LOCK:
+        if cache_key in _PDF_CACHE:
+            _PDF_CACHE.move_to_end(cache_key)
+            return _PDF_CACHE[cache_key]
+    
+    # IfMatch guarantees the bytes belong to the ETag they are cached under
+    response = s3_client.get_object(Bucket=bucket, Key=key, IfMatch=etag)
+    pdf_bytes = response['Body'].read()
+    
+    with _PDF_CACHE_LOCK:
+        # Drop older versions of the same key, then the least recently used PDFs
+        for stale in [k for k in _PDF_CACHE if k[:2] == (bucket, key)]:
+            del _PDF_CACHE[stale]
+        _PDF_CACHE[cache_key] = pdf_bytes
+        while len(_PDF_CACHE) > PDF_CACHE_SIZE:
+            _PDF_CACHE.popitem(last=False)
+    return pdf_bytes
 
 
-def render_pdf_page(pdf_bytes: bytes, page_num: int, dpi: int = 150):
+@lru_cache(maxsize=32)
+def _matrix(dpi: float):
     """
-    Render a PDF page to PIL image.
+    Shared render matrix per DPI (treated as read-only by callers)
+    """
+    return fitz.Matrix(dpi/72.0, dpi/72.0)
+
+
+@lru_cache(maxsize=8)
+def _open_pdf(pdf_bytes: bytes):
+    """
+    Parse a PDF once per distinct content instead of once per chunk
+    
+    Documents are never closed by callers; evicted entries are released by GC.
+    """
+    return fitz.open(stream=pdf_bytes, filetype="pdf")
+
+
+def _finalize(s3_client, bucket: str, key: str, body: bytes, content_type: str) -> str:
+    """
+    Upload a generated image and return its presigned URL.
+    
+    The key is recorded as existing and its URL is cached, so later lookups of
+    the same image skip both the HEAD and the re-signing.
+    """
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=body,
+        ContentType=content_type
+    )
+    _mark_exists(bucket, key)
+    return _presign(s3_client, bucket, key)
+
+
+def _box_rows(bounding_boxes) -> List[List]:
+    """
+    Pull [left, top, right, bottom] out of ADE box dicts (entries without 'left' are skipped)
+    """
+    return [
+        [bbox.get('left', 0), bbox.get('top', 0), bbox.get('right', 1), bbox.get('bottom', 1)]
+        for bbox in bounding_boxes
+        if bbox and 'left' in bbox
+    ]
+
+
+def _boxes_to_array(bounding_boxes):
+    """
+    Convert boxes to one contiguous (N, 4) float32 array of left, top, right, bottom.
+    
+    Args:
+        bounding_boxes: List of ADE box dicts, or an array-like of shape (N, 4)
+    
+    Returns:
+        New (N, 4) float32 ndarray (safe to modify in place)
+    """
+    if isinstance(bounding_boxes, np.ndarray):
+        return np.array(bounding_boxes, dtype=np.float32).reshape(-1, 4)
+    return np.array(_box_rows(bounding_boxes), dtype=np.float32).reshape(-1, 4)
+
+
+def _scale_boxes(bounding_boxes, width: float, height: float) -> List[Tuple[float, float, float, float]]:
+    """
+    Clamp normalized ADE boxes to 0-1 and scale them to page coordinates.
+    
+    Args:
+        bounding_boxes: Box dicts with 'left', 'top', 'right', 'bottom' (entries
+            without 'left' are skipped), or an (N, 4) array when NumPy is available
+        width: Page width (e.g. in PDF points)
+        height: Page height
+    
+    Returns:
+        List of (x0, y0, x1, y1) boxes
+    """
+    if NUMPY_AVAILABLE:
+        # One clip + multiply over all boxes instead of per-side Python math
+        arr = _boxes_to_array(bounding_boxes)
+        np.clip(arr, 0, 1, out=arr)
+        arr *= np.array([width, height, width, height], dtype=np.float32)
+        return [tuple(row) for row in arr.tolist()]
+    
+    return [
+        (
+            max(0, min(1, float(left))) * width,
+            max(0, min(1, float(top))) * height,
+            max(0, min(1, float(right))) * width,
+            max(0, min(1, float(bottom))) * height
+        )
+        for left, top, right, bottom in _box_rows(bounding_boxes)
+    ]
+
+
+def render_pdf_page(
+    pdf_bytes: bytes,
+    page_num: int,
+    dpi: int = 150,
+    bbox: Optional[List[float]] = None,
+    padding: int = 0,
+    target_width: Optional[int] = None,
+    grayscale: bool = False
+):
+    """
+    Render a PDF page (or just a region of it) to PIL image.
     
     Args:
         pdf_bytes: PDF file content as bytes
         page_num: Page number (0-indexed)
         dpi: Resolution for PDF rendering (default 150)
+        bbox: Optional [x0, y0, x1, y1] in NORMALIZED coordinates; when given,
+            only this region plus padding is rasterized
+        padding: Extra pixels around bbox (default 0)
+        target_width: Optional pixel width wanted for the bbox region; the DPI is
+            lowered (never below 72) so wide regions aren't rendered larger than needed
+        grayscale: Render a single-channel "L" image (1 byte per pixel instead of 3),
+            for effectively monochrome documents such as scans and forms
     
     Returns:
         Tuple of (PIL Image, page_width, page_height) or (None, None, None) if disabled
@@ -41,19 +273,107 @@ def render_pdf_page(pdf_bytes: bytes, page_num: int, dpi: int = 150):
         return None, None, None
     
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc[page_num]
-        mat = fitz.Matrix(dpi/72.0, dpi/72.0)
-        pix = page.get_pixmap(matrix=mat)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        page_width, page_height = page.rect.width, page.rect.height
-        doc.close()
+        with _RENDER_LOCK:
+            doc = _open_pdf(pdf_bytes)
+            page = doc[page_num]
+            page_width, page_height = page.rect.width, page.rect.height
+            
+            # Match rasterization to the display size: pixel count scales with DPI^2
+            if bbox and target_width:
+                bbox_width_pts = (bbox[2] - bbox[0]) * page_width
+                if bbox_width_pts > 0:
+                    dpi = int(min(dpi, max(MIN_DPI, target_width / (bbox_width_pts / 72.0))))
+            mat = _matrix(dpi)
+            
+            # Rasterize only the requested region instead of rendering the page and cropping
+            clip = None
+            if bbox:
+                pad_pts = padding * 72.0 / dpi
+                norm_x0, norm_y0, norm_x1, norm_y1 = bbox
+                clip = fitz.Rect(
+                    norm_x0 * page_width - pad_pts,
+                    norm_y0 * page_height - pad_pts,
+                    norm_x1 * page_width + pad_pts,
+                    norm_y1 * page_height + pad_pts
+                ) & page.rect
+            
+            colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+            pix = page.get_pixmap(matrix=mat, clip=clip, colorspace=colorspace)
+            # frombytes copies the samples, so every MuPDF object can be released
+            # here, under the lock, rather than when the frame unwinds
+            img = Image.frombytes("L" if grayscale else "RGB", [pix.width, pix.height], pix.samples)
+            del pix, page, doc
         return img, page_width, page_height
-    except Exception as e:
-        print(f"Error rendering PDF page: {e}")
+    except Exception:
+        logger.exception("Error rendering PDF page")
         return None, None, None
 
 
+def _chunk_image_key(source_document: str, chunk_id: str, grayscale: bool = False) -> str:
+    """
+    S3 key under which a chunk's cropped image is stored
+    """
+    suffix = "_gray" if grayscale else ""
+    return f"output/medical_chunk_images/{source_document}_{chunk_id}{suffix}.png"
+
+
+def _render_chunk_png(
+    pdf_bytes: bytes,
+    page_num: int,
+    bbox: Optional[List[float]],
+    highlight: bool = True,
+    padding: int = 10,
+    grayscale: bool = False
+) -> Optional[bytes]:
+    """
+    Render one chunk crop to PNG bytes (no S3 access, so safe in worker processes).
+    
+    Returns:
+        PNG bytes, or None if rendering failed or is disabled
+    """
+    # If no bbox or invalid bbox, render the full page; otherwise render
+    # only the chunk region (plus padding) straight from the PDF
+    has_bbox = bool(bbox) and len(bbox) == 4
+    chunk_img, _, _ = render_pdf_page(
+        pdf_bytes, page_num, bbox=bbox if has_bbox else None, padding=padding,
+        target_width=TARGET_CHUNK_WIDTH_PX, grayscale=grayscale
+    )
+    
+    if chunk_img is None:
+        return None
+    
+    # Add red border highlight (black on grayscale crops, which have no color)
+    if has_bbox and highlight:
+        draw = ImageDraw.Draw(chunk_img)
+        draw.rectangle(
+            [padding, padding, chunk_img.width - padding - 1, chunk_img.height - padding - 1],
+            outline=0 if grayscale else "red",
+            width=3
+        )
+    
+    # Convert to PNG bytes
+    img_bytes = io.BytesIO()
+    chunk_img.save(img_bytes, format='PNG', compress_level=PNG_COMPRESS_LEVEL, optimize=False)
+    return img_bytes.getvalue()
+
+
+def _render_chunks_png(pdf_bytes: bytes, chunk_specs: List[Dict]) -> List[Optional[bytes]]:
+    """
+    Process-pool worker: render every requested chunk of one PDF
+    """
+    return [
+        _render_chunk_png(
+            pdf_bytes,
+            spec['page_num'],
+            spec.get('bbox'),
+            spec.get('highlight', True),
+            spec.get('padding', 10),
+            spec.get('grayscale', False)
+        )
+        for spec in chunk_specs
+    ]
+
+
 def extract_chunk_image(
     s3_client,
     bucket: str,
@@ -63,7 +383,8 @@ def extract_chunk_image(
     chunk_id: str,
     source_document: str,
     highlight: bool = True,
-    padding: int = 10
+    padding: int = 10,
+    grayscale: bool = False
 ) -> Optional[str]:
     """
     Dynamically extract and crop a specific chunk from PDF stored in S3.
@@ -78,6 +399,7 @@ def extract_chunk_image(
         source_document: Document name without extension
         highlight: Add red border around chunk (default True)
         padding: Extra pixels around bbox (default 10)
+        grayscale: Render a grayscale crop for known-monochrome PDFs (default False)
     
     Returns:
         S3 presigned URL of the cropped chunk image or None
@@ -88,95 +410,159 @@ def extract_chunk_image(
     
     try:
         # Check if chunk image already exists
-        image_key = f"output/medical_chunk_images/{source_document}_{chunk_id}.png"
-        try:
-            s3_client.head_object(Bucket=bucket, Key=image_key)
+        image_key = _chunk_image_key(source_document, chunk_id, grayscale)
+        if _object_exists(s3_client, bucket, image_key):
             # Image exists, return presigned URL
-            presigned_url = s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': bucket, 'Key': image_key},
-                ExpiresIn=3600
-            )
-            return presigned_url
-        except:
-            pass  # Image doesn't exist, create it
+            return _presign(s3_client, bucket, image_key)
         
         # Download PDF from S3
-        response = s3_client.get_object(Bucket=bucket, Key=source_pdf_key)
-        pdf_bytes = response['Body'].read()
-        
-        # Render the PDF page
-        img, page_width, page_height = render_pdf_page(pdf_bytes, page_num)
+        pdf_bytes = _get_pdf_bytes(s3_client, bucket, source_pdf_key)
         
-        if img is None:
+        image_data = _render_chunk_png(pdf_bytes, page_num, bbox, highlight, padding, grayscale)
+        if image_data is None:
             return None
         
-        # If no bbox or invalid bbox, return full page
-        if not bbox or len(bbox) != 4:
-            img_bytes = io.BytesIO()
-            img.save(img_bytes, format='PNG')
-            img_bytes.seek(0)
-            image_data = img_bytes.getvalue()
-        else:
-            # Extract normalized bbox coordinates (0-1 range)
-            norm_x0, norm_y0, norm_x1, norm_y1 = bbox
-            
-            # Convert normalized coordinates to PDF points
-            pdf_x0 = norm_x0 * page_width
-            pdf_y0 = norm_y0 * page_height
-            pdf_x1 = norm_x1 * page_width
-            pdf_y1 = norm_y1 * page_height
-            
-            # Scale PDF points to image pixels
-            scale_x = img.width / page_width
-            scale_y = img.height / page_height
-            
-            # Apply scaling and padding
-            crop_x0 = max(0, int(pdf_x0 * scale_x) - padding)
-            crop_y0 = max(0, int(pdf_y0 * scale_y) - padding)
-            crop_x1 = min(img.width, int(pdf_x1 * scale_x) + padding)
-            crop_y1 = min(img.height, int(pdf_y1 * scale_y) + padding)
-            
-            # Crop to chunk region
-            chunk_img = img.crop((crop_x0, crop_y0, crop_x1, crop_y1))
-            
-            # Add red border highlight
-            if highlight:
-                draw = ImageDraw.Draw(chunk_img)
-                draw.rectangle(
-                    [padding, padding, chunk_img.width - padding - 1, chunk_img.height - padding - 1],
-                    outline="red",
-                    width=3
-                )
-            
-            # Convert to PNG bytes
-            img_bytes = io.BytesIO()
-            chunk_img.save(img_bytes, format='PNG')
-            img_bytes.seek(0)
-            image_data = img_bytes.getvalue()
+        # Upload to S3 and return presigned URL
+        return _finalize(s3_client, bucket, image_key, image_data, 'image/png')
         
-        # Upload to S3
-        s3_client.put_object(
-            Bucket=bucket,
-            Key=image_key,
-            Body=image_data,
-            ContentType='image/png'
-        )
-        
-        # Generate presigned URL
-        presigned_url = s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': bucket, 'Key': image_key},
-            ExpiresIn=3600
-        )
-        
-        return presigned_url
-        
-    except Exception as e:
-        print(f"Error extracting chunk image: {e}")
+    except Exception:
+        logger.exception("Error extracting chunk image")
         return None
 
 
+def extract_chunks_batch(
+    s3_client,
+    bucket: str,
+    source_pdf_key: str,
+    chunk_specs: List[Dict],
+    source_document: Optional[str] = None,
+    max_workers: int = 8
+) -> List[Optional[str]]:
+    """
+    Extract many chunk images from one PDF concurrently.
+    
+    Args:
+        s3_client: Boto3 S3 client
+        bucket: S3 bucket name
+        source_pdf_key: S3 key of the source PDF
+        chunk_specs: List of dicts with 'bbox', 'page_num' and 'chunk_id'
+            (optional 'highlight', 'padding' and 'grayscale'), as for extract_chunk_image
+        source_document: Document name without extension (default: PDF key stem)
+        max_workers: Number of chunks processed in parallel (default 8)
+    
+    Returns:
+        Presigned URLs (or None on failure) in the same order as chunk_specs
+    """
+    if source_document is None:
+        source_document = Path(source_pdf_key).stem
+    
+    # Warm the PDF cache with a single GET so workers don't race to download it;
+    # on failure each worker retries and reports its own error
+    try:
+        _get_pdf_bytes(s3_client, bucket, source_pdf_key)
+    except Exception:
+        logger.exception("Error prefetching %s", source_pdf_key)
+    
+    def extract(spec: Dict) -> Optional[str]:
+        return extract_chunk_image(
+            s3_client,
+            bucket,
+            source_pdf_key,
+            bbox=spec.get('bbox'),
+            page_num=spec['page_num'],
+            chunk_id=spec['chunk_id'],
+            source_document=source_document,
+            highlight=spec.get('highlight', True),
+            padding=spec.get('padding', 10),
+            grayscale=spec.get('grayscale', False)
+        )
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(extract, chunk_specs))
+
+
+def extract_chunks_multi_pdf(
+    s3_client,
+    bucket: str,
+    jobs: Dict[str, List[Dict]],
+    max_workers: Optional[int] = None
+) -> Dict[str, List[Optional[str]]]:
+    """
+    Extract chunk images from many PDFs, rendering in parallel worker processes.
+    
+    Rendering is CPU-bound, so each PDF's chunks are rendered in a separate
+    process; all S3 access (download, existence checks, upload, presigning)
+    stays in the calling process.
+    
+    Args:
+        s3_client: Boto3 S3 client
+        bucket: S3 bucket name
+        jobs: Mapping of source PDF key to its chunk specs (dicts with 'bbox',
+            'page_num', 'chunk_id' and optional 'highlight' / 'padding' / 'grayscale')
+        max_workers: Number of worker processes (default: CPU count)
+    
+    Returns:
+        Mapping of source PDF key to presigned URLs (or None) in chunk_specs order
+    """
+    if not DYNAMIC_CROPPING_ENABLED:
+        print("⚠️ Dynamic cropping disabled. Install PyMuPDF and Pillow.")
+        return {key: [None] * len(specs) for key, specs in jobs.items()}
+    
+    results = {}
+    pending = {}
+    for source_pdf_key, specs in jobs.items():
+        source_document = Path(source_pdf_key).stem
+        image_keys = [
+            _chunk_image_key(source_document, spec['chunk_id'], spec.get('grayscale', False))
+            for spec in specs
+        ]
+        results[source_pdf_key] = [None] * len(specs)
+        try:
+            for i, key in enumerate(image_keys):
+                if _object_exists(s3_client, bucket, key):
+                    results[source_pdf_key][i] = _presign(s3_client, bucket, key)
+        except Exception:
+            logger.exception("Error checking chunk images for %s", source_pdf_key)
+            results[source_pdf_key] = [None] * len(specs)
+            continue
+        missing = [i for i, url in enumerate(results[source_pdf_key]) if url is None]
+        if missing:
+            pending[source_pdf_key] = (image_keys, missing)
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for source_pdf_key, (_, missing) in pending.items():
+            try:
+                future = executor.submit(
+                    _render_chunks_png,
+                    _get_pdf_bytes(s3_client, bucket, source_pdf_key),
+                    [jobs[source_pdf_key][i] for i in missing]
+                )
+            except Exception:
+                logger.exception("Error fetching %s", source_pdf_key)
+                continue
+            futures[future] = source_pdf_key
+        for future in as_completed(futures):
+            source_pdf_key = futures[future]
+            image_keys, missing = pending[source_pdf_key]
+            try:
+                images = future.result()
+            except Exception:
+                logger.exception("Error extracting chunk images for %s", source_pdf_key)
+                continue
+            for i, image_data in zip(missing, images):
+                if image_data is None:
+                    continue
+                try:
+                    results[source_pdf_key][i] = _finalize(
+                        s3_client, bucket, image_keys[i], image_data, 'image/png'
+                    )
+                except Exception:
+                    logger.exception("Error uploading chunk image %s", image_keys[i])
+    
+    return results
+
+
 def create_annotated_image_from_pdf(
     pdf_bytes: bytes,
     page_num: int,
@@ -193,8 +579,10 @@ def create_annotated_image_from_pdf(
     Args:
         pdf_bytes: PDF file content as bytes
         page_num: Page number (1-indexed)
-        bounding_boxes: List of bounding box dictionaries with 'left', 'top', 'right', 'bottom'
-        output_s3_key: S3 key for the output annotated image
+        bounding_boxes: List of bounding box dictionaries with 'left', 'top', 'right', 'bottom',
+            or an (N, 4) NumPy array of normalized left/top/right/bottom rows
+        output_s3_key: S3 key for the output annotated image (.jpg/.jpeg saves
+            JPEG, anything else PNG)
         s3_client: Boto3 S3 client
         bucket: S3 bucket name
         dpi: Resolution for PDF rendering
@@ -204,24 +592,6 @@ def create_annotated_image_from_pdf(
         S3 URL of the uploaded annotated image
     """
     try:
-        # Open PDF with PyMuPDF
-        pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-        
-        # Get the specific page (0-indexed in PyMuPDF)
-        page = pdf_document[page_num - 1] if page_num > 0 else pdf_document[page_num]
-        
-        # Render page to image at specified DPI
-        mat = fitz.Matrix(dpi/72.0, dpi/72.0)
-        pix = page.get_pixmap(matrix=mat)
-        img_data = pix.tobytes("png")
-        
-        # Open image with PIL
-        img = Image.open(io.BytesIO(img_data))
-        draw = ImageDraw.Draw(img)
-        
-        # Get image dimensions
-        img_width, img_height = img.size
-        
         # Define colors based on chunk type (matching ADE chunk types)
         CHUNK_TYPE_COLORS = {
             "text": (40, 167, 69),           # Green
@@ -236,77 +606,63 @@ def create_annotated_image_from_pdf(
             "tablecell": (173, 216, 230),    # Light blue
             "default": (128, 128, 128)       # Gray for unknown types
         }
-        # Get RGB color based on chunk type
+        # Get RGB color based on chunk type (PyMuPDF expects 0-1 components)
         rgb_color = CHUNK_TYPE_COLORS.get(chunk_type.lower(), CHUNK_TYPE_COLORS["default"])
+        pdf_color = tuple(c / 255 for c in rgb_color)
         
-        # Draw bounding boxes
-        for bbox in bounding_boxes:
-            if bbox and 'left' in bbox:
-                # The coordinates from ADE are normalized (0-1) relative to the PDF page
-                # Convert to pixel coordinates for the rendered image
-                left = float(bbox.get('left', 0))
-                top = float(bbox.get('top', 0))
-                right = float(bbox.get('right', 1))
-                bottom = float(bbox.get('bottom', 1))
-                
-                # Ensure coordinates are in 0-1 range
-                left = max(0, min(1, left))
-                top = max(0, min(1, top))
-                right = max(0, min(1, right))
-                bottom = max(0, min(1, bottom))
-                
-                # Convert to pixel coordinates
-                x1 = int(left * img_width)
-                y1 = int(top * img_height)
-                x2 = int(right * img_width)
-                y2 = int(bottom * img_height)
-                
-                # Draw rectangle with thick outline for visibility
-                draw.rectangle(
-                    [x1, y1, x2, y2],
-                    outline=rgb_color,
-                    width=3
-                )
-                
-                # Add semi-transparent overlay for better visibility
-                overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
-                overlay_draw = ImageDraw.Draw(overlay)
-                
-                # Create semi-transparent version of the RGB color
-                fill_color = rgb_color + (30,)  # Add alpha channel for transparency
-                
-                overlay_draw.rectangle(
-                    [x1, y1, x2, y2],
-                    fill=fill_color
+        with _RENDER_LOCK:
+            # Open PDF with PyMuPDF
+            pdf_document = _open_pdf(pdf_bytes)
+            
+            # Get the specific page (0-indexed in PyMuPDF), copied into a scratch
+            # document so drawing never modifies the cached source PDF
+            page_index = page_num - 1 if page_num > 0 else page_num
+            scratch = fitz.open()
+            scratch.insert_pdf(pdf_document, from_page=page_index, to_page=page_index)
+            page = scratch[0]
+            
+            # Draw bounding boxes on the page itself; MuPDF rasterizes them in the
+            # same pass as the page, so no Python-level pixel work is needed.
+            # The coordinates from ADE are normalized (0-1) relative to the PDF page;
+            # they are clamped and converted to PDF points in one pass
+            page_width, page_height = page.rect.width, page.rect.height
+            for x0, y0, x1, y1 in _scale_boxes(bounding_boxes, page_width, page_height):
+                # Semi-transparent fill for visibility, thick opaque outline on top
+                page.draw_rect(
+                    fitz.Rect(x0, y0, x1, y1) * page.derotation_matrix,
+                    color=pdf_color,
+                    fill=pdf_color,
+                    fill_opacity=FILL_OPACITY,
+                    width=BOX_WIDTH * 72.0 / dpi  # BOX_WIDTH pixels at the render DPI
                 )
-                img = Image.alpha_composite(img.convert('RGBA'), overlay).convert('RGB')
+            
+            # Render page to image at specified DPI
+            mat = _matrix(dpi)
+            pix = page.get_pixmap(matrix=mat)
+            
+            # Wrap the raw samples directly; a PNG encode/decode round trip is pure overhead.
+            # frombytes copies them, so MuPDF objects are released while the lock is held
+            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            del pix, page
+            scratch.close()
+            del scratch, pdf_document
         
-        # Save to bytes
+        # Save to bytes; full rendered pages are far smaller as JPEG, so the
+        # output key's extension picks the format
         img_bytes = io.BytesIO()
-        img.save(img_bytes, format='PNG')
+        if output_s3_key.lower().endswith(('.jpg', '.jpeg')):
+            img.save(img_bytes, format='JPEG', quality=JPEG_QUALITY, optimize=False)
+            content_type = 'image/jpeg'
+        else:
+            img.save(img_bytes, format='PNG', compress_level=PNG_COMPRESS_LEVEL, optimize=False)
+            content_type = 'image/png'
         img_bytes.seek(0)
         
-        # Upload to S3
-        s3_client.put_object(
-            Bucket=bucket,
-            Key=output_s3_key,
-            Body=img_bytes.getvalue(),
-            ContentType='image/png'
-        )
-        
-        pdf_document.close()
-        
-        # Generate presigned URL for the image
-        presigned_url = s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': bucket, 'Key': output_s3_key},
-            ExpiresIn=3600  # URL valid for 1 hour
-        )
-        
-        return presigned_url
+        # Upload to S3 and return presigned URL for the image
+        return _finalize(s3_client, bucket, output_s3_key, img_bytes.getvalue(), content_type)
         
-    except Exception as e:
-        print(f"Error creating annotated image: {e}")
+    except Exception:
+        logger.exception("Error creating annotated image")
         return None
 
 
@@ -336,26 +692,17 @@ def get_or_create_annotated_image(
     # Generate annotation key
     page_num = grounding_info.get('page', 1)
     clean_chunk_id = chunk_id.replace('<a id=', '').replace('></a>', '').strip('"')
-    annotation_key = f"annotations/{Path(source_pdf_key).stem}_p{page_num}_{clean_chunk_id}.png"
+    annotation_key = f"annotations/{Path(source_pdf_key).stem}_p{page_num}_{clean_chunk_id}.jpg"
     
-    # Check if annotation already exists
-    if not force_recreate:
-        try:
-            s3_client.head_object(Bucket=bucket, Key=annotation_key)
-            # Generate presigned URL for existing annotation
-            presigned_url = s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': bucket, 'Key': annotation_key},
-                ExpiresIn=3600  # URL valid for 1 hour
-            )
-            return presigned_url
-        except:
-            pass  # File doesn't exist, create it
-    
-    # Download source PDF
     try:
-        response = s3_client.get_object(Bucket=bucket, Key=source_pdf_key)
-        pdf_bytes = response['Body'].read()
+        # Check if annotation already exists
+        if not force_recreate:
+            if _object_exists(s3_client, bucket, annotation_key):
+                # Generate presigned URL for existing annotation
+                return _presign(s3_client, bucket, annotation_key)
+        
+        # Download source PDF
+        pdf_bytes = _get_pdf_bytes(s3_client, bucket, source_pdf_key)
         
         # Create annotated image
         bbox = grounding_info.get('box', {})
@@ -371,8 +718,8 @@ def get_or_create_annotated_image(
         
         return url
         
-    except Exception as e:
-        print(f"Error processing annotation: {e}")
+    except Exception:
+        logger.exception("Error processing annotation")
         return None
 
 
@@ -386,15 +733,7 @@ def extract_chunk_id_from_markdown(markdown_text: str) -> Optional[str]:
     Returns:
         Chunk ID or None if not found
     """
-    import re
-    
-    # Look for anchor tags with IDs
-    pattern = r'<a id=["\'](.*?)["\']></a>'
-    match = re.search(pattern, markdown_text)
-    
-    if match:
-        return match.group(1)
-    
-    return None
+    match = _CHUNK_ID_RE.search(markdown_text)
+    return match.group(1) if match else None
 
 